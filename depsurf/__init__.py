@@ -4,13 +4,18 @@ from .bpf_program import *
 from .btf import *
 from .dep import *
 from .diff import *
+from .diff_cache import *
+from .diff_matrix import *
 from .funcs import *
 from .issues import *
 from .linux import *
 from .linux_image import *
+from .pack import *
+from .parallel_diff import *
 from .paths import *
 from .prep import *
 from .report import *
+from .type_store import *
 from .utils import *
 from .version import *
 from .version_group import *
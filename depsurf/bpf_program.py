@@ -4,7 +4,7 @@ from typing import Dict, List
 
 from elftools.elf.elffile import ELFFile
 
-from depsurf.btf import Kind, Types, dump_btf_json, gen_min_btf
+from depsurf.btf import Kind, Types, gen_min_btf
 from depsurf.dep import Dep, DepKind
 
 
@@ -27,10 +27,6 @@ class BPFProgram:
     def btf_file(self):
         return self.path.with_suffix(".min.btf")
 
-    @property
-    def btf_json_file(self):
-        return self.path.with_suffix(".min.btf.json")
-
     @property
     def btf_txt_file(self):
         return self.path.with_suffix(".min.btf.txt")
@@ -71,13 +67,7 @@ class BPFProgram:
             slient=True,
             overwrite=True,
         )
-        dump_btf_json(
-            self.btf_file,
-            result_path=self.btf_json_file,
-            slient=True,
-            overwrite=True,
-        )
-        struct_types = Types.from_btf_json(self.btf_json_file, Kind.STRUCT)
+        struct_types = Types.from_btf(self.btf_file, Kind.STRUCT)
 
         results = []
         for name, struct in struct_types.items():
@@ -1,4 +1,5 @@
 from .bpftool import *
 from .dump import *
 from .kind import *
+from .raw import *
 from .types import *
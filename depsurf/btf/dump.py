@@ -1,21 +1,32 @@
 import json
 import logging
+from contextlib import ExitStack
 from functools import cached_property
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Iterator, Optional, Set
 
-from depsurf.utils import manage_result_path
+from depsurf.utils import manage_result_path, manage_result_paths
 
 from .kind import Kind
+from .raw import load_btf_types
+from .types import LazyTypesData
 
 
 class BTFNormalizer:
-    def __init__(self, path: Path):
-        assert path.suffix == ".json"
+    def __init__(self, path: Path, memo_size: Optional[int] = None):
+        # Either the output of `bpftool btf dump --json` or the raw .BTF blob
         self.path = path
 
+        # Non-recursive results keyed by type id, shared by all referrers.
+        # Bounded by `memo_size` (oldest evicted first) and dropped after
+        # each full walk over the types.
+        self.memo: Dict[int, Dict] = {}
+        self.memo_size = memo_size
+
     @cached_property
     def raw_types(self):
+        if self.path.suffix != ".json":
+            return load_btf_types(self.path)
         with open(self.path) as f:
             return json.load(f)["types"]
 
@@ -127,6 +138,22 @@ class BTFNormalizer:
         if type_id == 0:
             return {"name": "void", "kind": Kind.VOID.value}
 
+        # Kinds in RECURSE_KINDS normalize the same way regardless of `recurse`
+        if recurse and self.get_raw(type_id)["kind"] not in self.RECURSE_KINDS:
+            return self.normalize_impl(type_id, recurse=True)
+
+        t = self.memo.get(type_id)
+        if t is None:
+            t = self.normalize_impl(type_id, recurse=False)
+            if self.memo_size is not None and len(self.memo) >= self.memo_size:
+                del self.memo[next(iter(self.memo))]
+            self.memo[type_id] = t
+        return t
+
+    def clear_memo(self):
+        self.memo.clear()
+
+    def normalize_impl(self, type_id, recurse):
         elem = self.get_raw(type_id)
 
         kind = elem["kind"]
@@ -156,12 +183,16 @@ class BTFNormalizer:
 
         return elem
 
-    @cached_property
-    def data(self):
-        results: Dict[str, Dict[str, Dict]] = {k.value: {} for k in Kind}
+    def iter_types(self, kinds: Optional[Iterable[Kind]] = None) -> Iterator[Dict]:
+        kinds = None if kinds is None else set(kinds)
 
+        names: Dict[str, Set[str]] = {}
         anon_enum_values = []
-        for i in range(1, len(self.raw_types) + 1):
+        for i, elem in enumerate(self.raw_types, start=1):
+            # Skip unwanted kinds before paying for normalization
+            if kinds is not None and elem["kind"] not in kinds:
+                continue
+
             t = self.normalize(i, recurse=True)
 
             name = t.get("name")
@@ -173,23 +204,29 @@ class BTFNormalizer:
                     anon_enum_values += t["values"]
                 continue
 
-            kind = t["kind"]
-            group = results.get(kind)
-            if group is None:
-                results[kind] = {name: t}
-            else:
-                if name in group:
-                    logging.debug(f"Duplicate type {name}")
-                else:
-                    group[name] = t
+            group = names.setdefault(t["kind"], set())
+            if name in group:
+                logging.debug(f"Duplicate type {name}")
+                continue
+            group.add(name)
+
+            yield t
 
         if anon_enum_values:
-            results[Kind.ENUM.value]["(anon)"] = {
+            yield {
                 "kind": "ENUM",
                 "name": "(anon)",
                 "size": 4,
                 "values": anon_enum_values,
             }
+
+        self.clear_memo()
+
+    @cached_property
+    def data(self):
+        results: Dict[str, Dict[str, Dict]] = {k.value: {} for k in Kind}
+        for t in self.iter_types():
+            results[t["kind"]][t["name"]] = t
         return results
 
     @manage_result_path
@@ -198,10 +235,32 @@ class BTFNormalizer:
             for k, v in self.data[kind].items():
                 print(json.dumps(v), file=f)
 
+    @manage_result_paths
+    def dump_types_streaming(self, result_paths: Dict[Kind, Path]):
+        with ExitStack() as stack:
+            files = {
+                kind.value: stack.enter_context(open(path, "w"))
+                for kind, path in result_paths.items()
+            }
+            for t in self.iter_types(result_paths.keys()):
+                print(json.dumps(t), file=files[t["kind"]])
+
 
 def dump_types(
-    btf_json_path: Path, result_paths: Dict[Kind, Path], overwrite: bool = False
+    btf_path: Path,
+    result_paths: Dict[Kind, Path],
+    overwrite: bool = False,
+    streaming: bool = True,
 ):
-    normalizer = BTFNormalizer(btf_json_path)
-    for kind, path in result_paths.items():
-        normalizer.dump_types(kind, result_path=path, overwrite=overwrite)
+    normalizer = BTFNormalizer(btf_path)
+    if streaming:
+        # One walk over the raw types writes all kinds without building `data`
+        normalizer.dump_types_streaming(result_paths=result_paths, overwrite=overwrite)
+    else:
+        for kind, path in result_paths.items():
+            normalizer.dump_types(kind, result_path=path, overwrite=overwrite)
+
+    # Index the dumps right away, so that their offsets and fingerprints are
+    # computed once here rather than by the first reader
+    for path in result_paths.values():
+        LazyTypesData.from_path(path)
@@ -0,0 +1,242 @@
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from .kind import Kind
+
+# Ref: https://github.com/torvalds/linux/blob/master/include/uapi/linux/btf.h
+BTF_MAGIC = 0xEB9F
+
+BTF_KINDS = [
+    None,
+    Kind.INT,
+    Kind.PTR,
+    Kind.ARRAY,
+    Kind.STRUCT,
+    Kind.UNION,
+    Kind.ENUM,
+    Kind.FWD,
+    Kind.TYPEDEF,
+    Kind.VOLATILE,
+    Kind.CONST,
+    Kind.RESTRICT,
+    Kind.FUNC,
+    Kind.FUNC_PROTO,
+    Kind.VAR,
+    Kind.DATASEC,
+    Kind.FLOAT,
+    Kind.DECL_TAG,
+    Kind.TYPE_TAG,
+    Kind.ENUM64,
+]
+
+# Ref: https://github.com/libbpf/bpftool/blob/main/src/btf.c
+INT_ENCODINGS = {1: "SIGNED", 2: "CHAR", 4: "BOOL"}
+FUNC_LINKAGES = {0: "static", 1: "global", 2: "extern"}
+VAR_LINKAGES = {0: "static", 1: "global", 2: "extern"}
+
+
+# Decodes a raw .BTF blob into the same records as `bpftool btf dump --json`
+class BTFReader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+
+        if bytes(self.data[:2]) == BTF_MAGIC.to_bytes(2, "little"):
+            self.endian = "<"
+        elif bytes(self.data[:2]) == BTF_MAGIC.to_bytes(2, "big"):
+            self.endian = ">"
+        else:
+            raise ValueError(f"Invalid BTF magic: {bytes(self.data[:2]).hex()}")
+
+        (
+            self.version,
+            self.flags,
+            hdr_len,
+            type_off,
+            type_len,
+            str_off,
+            str_len,
+        ) = struct.unpack_from(f"{self.endian}2xBBIIIII", self.data)
+
+        self.types = self.data[hdr_len + type_off : hdr_len + type_off + type_len]
+        self.strs = bytes(self.data[hdr_len + str_off : hdr_len + str_off + str_len])
+
+        self.u32 = struct.Struct(f"{self.endian}I")
+        self.u32x2 = struct.Struct(f"{self.endian}II")
+        self.u32x3 = struct.Struct(f"{self.endian}III")
+        self.enum = struct.Struct(f"{self.endian}Ii")
+        self.enum64 = struct.Struct(f"{self.endian}III")
+        self.decl_tag = struct.Struct(f"{self.endian}i")
+
+    @classmethod
+    def from_path(cls, path: Path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def get_str(self, off: int) -> str:
+        if off == 0:
+            return "(anon)"
+        end = self.strs.index(b"\x00", off)
+        return self.strs[off:end].decode()
+
+    def iter_types(self) -> Iterator[Dict]:
+        pos = 0
+        type_id = 1
+        while pos < len(self.types):
+            name_off, info, size_or_type = self.u32x3.unpack_from(self.types, pos)
+            pos += self.u32x3.size
+
+            kind_id = (info >> 24) & 0x1F
+            kind = BTF_KINDS[kind_id] if kind_id < len(BTF_KINDS) else None
+            if kind is None:
+                raise ValueError(f"Unknown BTF kind in {info:#x} for type {type_id}")
+            vlen = info & 0xFFFF
+            kflag = info >> 31
+
+            elem = {"id": type_id, "kind": kind.value, "name": self.get_str(name_off)}
+            pos = self.decode(elem, kind, vlen, kflag, size_or_type, pos)
+
+            yield elem
+            type_id += 1
+
+    @staticmethod
+    def decode_int_encoding(encoding: int) -> str:
+        # The encoding is a set of flags, e.g. SIGNED|CHAR for a signed char
+        if encoding == 0:
+            return "(none)"
+        names = [name for bit, name in INT_ENCODINGS.items() if encoding & bit]
+        unknown = encoding & ~sum(INT_ENCODINGS)
+        if unknown:
+            names.append(f"UNKN({unknown:#x})")
+        return "|".join(names)
+
+    def decode(self, elem: Dict, kind, vlen, kflag, size_or_type, pos) -> int:
+        if kind == Kind.INT:
+            (val,) = self.u32.unpack_from(self.types, pos)
+            elem["size"] = size_or_type
+            elem["bits_offset"] = (val >> 16) & 0xFF
+            elem["nr_bits"] = val & 0xFF
+            elem["encoding"] = self.decode_int_encoding((val >> 24) & 0x0F)
+            return pos + self.u32.size
+
+        if kind in (
+            Kind.PTR,
+            Kind.CONST,
+            Kind.VOLATILE,
+            Kind.RESTRICT,
+            Kind.TYPEDEF,
+            Kind.TYPE_TAG,
+        ):
+            elem["type_id"] = size_or_type
+            return pos
+
+        if kind == Kind.ARRAY:
+            type_id, index_type_id, nr_elems = self.u32x3.unpack_from(self.types, pos)
+            elem["type_id"] = type_id
+            elem["index_type_id"] = index_type_id
+            elem["nr_elems"] = nr_elems
+            return pos + self.u32x3.size
+
+        if kind in (Kind.STRUCT, Kind.UNION):
+            elem["size"] = size_or_type
+            elem["vlen"] = vlen
+            members: List[Dict] = []
+            for name_off, type_id, offset in self.u32x3.iter_unpack(
+                self.types[pos : pos + vlen * self.u32x3.size]
+            ):
+                member = {"name": self.get_str(name_off), "type_id": type_id}
+                if kflag:
+                    member["bits_offset"] = offset & 0xFFFFFF
+                    if offset >> 24:
+                        member["bitfield_size"] = offset >> 24
+                else:
+                    member["bits_offset"] = offset
+                members.append(member)
+            elem["members"] = members
+            return pos + vlen * self.u32x3.size
+
+        if kind == Kind.ENUM:
+            elem["encoding"] = "SIGNED" if kflag else "UNSIGNED"
+            elem["size"] = size_or_type
+            elem["vlen"] = vlen
+            elem["values"] = [
+                {
+                    "name": self.get_str(name_off),
+                    "val": val if kflag else val & 0xFFFFFFFF,
+                }
+                for name_off, val in self.enum.iter_unpack(
+                    self.types[pos : pos + vlen * self.enum.size]
+                )
+            ]
+            return pos + vlen * self.enum.size
+
+        if kind == Kind.ENUM64:
+            elem["encoding"] = "SIGNED" if kflag else "UNSIGNED"
+            elem["size"] = size_or_type
+            elem["vlen"] = vlen
+            values = []
+            for name_off, lo, hi in self.enum64.iter_unpack(
+                self.types[pos : pos + vlen * self.enum64.size]
+            ):
+                val = (hi << 32) | lo
+                if kflag and val >= (1 << 63):
+                    val -= 1 << 64
+                values.append({"name": self.get_str(name_off), "val": val})
+            elem["values"] = values
+            return pos + vlen * self.enum64.size
+
+        if kind == Kind.FWD:
+            elem["fwd_kind"] = "union" if kflag else "struct"
+            return pos
+
+        if kind == Kind.FUNC:
+            elem["type_id"] = size_or_type
+            elem["linkage"] = FUNC_LINKAGES.get(vlen, "(unknown)")
+            return pos
+
+        if kind == Kind.FUNC_PROTO:
+            elem["ret_type_id"] = size_or_type
+            elem["vlen"] = vlen
+            elem["params"] = [
+                {"name": self.get_str(name_off), "type_id": type_id}
+                for name_off, type_id in self.u32x2.iter_unpack(
+                    self.types[pos : pos + vlen * self.u32x2.size]
+                )
+            ]
+            return pos + vlen * self.u32x2.size
+
+        if kind == Kind.VAR:
+            (linkage,) = self.u32.unpack_from(self.types, pos)
+            elem["type_id"] = size_or_type
+            elem["linkage"] = VAR_LINKAGES.get(linkage, "(unknown)")
+            return pos + self.u32.size
+
+        if kind == Kind.DATASEC:
+            elem["size"] = size_or_type
+            elem["vlen"] = vlen
+            elem["vars"] = [
+                {"type_id": type_id, "offset": offset, "size": size}
+                for type_id, offset, size in self.u32x3.iter_unpack(
+                    self.types[pos : pos + vlen * self.u32x3.size]
+                )
+            ]
+            return pos + vlen * self.u32x3.size
+
+        if kind == Kind.FLOAT:
+            elem["size"] = size_or_type
+            return pos
+
+        if kind == Kind.DECL_TAG:
+            (component_idx,) = self.decl_tag.unpack_from(self.types, pos)
+            elem["type_id"] = size_or_type
+            elem["component_idx"] = component_idx
+            return pos + self.decl_tag.size
+
+        raise NotImplementedError(f"Unsupported BTF kind {kind}")
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.iter_types()
+
+
+def load_btf_types(path: Path) -> List[Dict]:
+    return list(BTFReader.from_path(path).iter_types())
@@ -1,34 +1,173 @@
+import hashlib
 import json
 import logging
+import os
+import re
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterator, Optional, Tuple
 
 from .kind import Kind
 
 
+# Records are dumped in a fixed key order and without type ids, so the same type
+# has byte-identical lines (and thus fingerprints) in different versions
+def get_fingerprint(line: bytes) -> str:
+    return hashlib.blake2b(line.rstrip(b"\n"), digest_size=16).hexdigest()
+
+
+class LazyTypesData(Mapping):
+    # Matches the record prefix written by BTFNormalizer: {"kind": ..., "name": ...
+    NAME_PREFIX = re.compile(rb'^\{"kind": "\w+", "name": ')
+
+    def __init__(
+        self,
+        path: Path,
+        offsets: Dict[str, Tuple[int, int]],
+        fingerprints: Dict[str, str],
+    ):
+        self.path = path
+        self.offsets = offsets
+        self.fingerprints = fingerprints
+        self.decoded: Dict[str, Dict] = {}
+        self.fd = None
+
+    def __del__(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+    @staticmethod
+    def get_index_path(path: Path) -> Path:
+        return path.parent / f"{path.name}.idx"
+
+    @classmethod
+    def get_name(cls, line: bytes) -> str:
+        m = cls.NAME_PREFIX.match(line)
+        if m is None:
+            return json.loads(line)["name"]
+        name, _ = json.JSONDecoder().raw_decode(line[m.end() :].decode())
+        return name
+
+    @classmethod
+    def build_index(cls, path: Path) -> Tuple[Dict, Dict]:
+        offsets = {}
+        fingerprints = {}
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                name = cls.get_name(line)
+                offsets[name] = (offset, len(line))
+                fingerprints[name] = get_fingerprint(line)
+                offset += len(line)
+        return offsets, fingerprints
+
+    @classmethod
+    def from_path(cls, path: Path):
+        stat = path.stat()
+        index_path = cls.get_index_path(path)
+
+        if index_path.exists():
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if (
+                index["size"] == stat.st_size
+                and index["mtime"] == stat.st_mtime_ns
+                and "fingerprints" in index
+            ):
+                offsets = {k: tuple(v) for k, v in index["offsets"].items()}
+                return cls(path, offsets, index["fingerprints"])
+            logging.info(f"Rebuilding stale index {index_path}")
+
+        offsets, fingerprints = cls.build_index(path)
+        index = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "offsets": offsets,
+            "fingerprints": fingerprints,
+        }
+        tmp_path = index_path.parent / f"{index_path.name}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            tmp_path.rename(index_path)
+        except OSError as e:
+            logging.warning(f"Could not write index {index_path}: {e}")
+        return cls(path, offsets, fingerprints)
+
+    def __getitem__(self, name: str) -> Dict:
+        t = self.decoded.get(name)
+        if t is not None:
+            return t
+
+        offset, length = self.offsets[name]
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY)
+        t = json.loads(os.pread(self.fd, length, offset))
+        self.decoded[name] = t
+        return t
+
+    def __contains__(self, name) -> bool:
+        return name in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getstate__(self):
+        return {
+            "path": self.path,
+            "offsets": self.offsets,
+            "fingerprints": self.fingerprints,
+            "decoded": self.decoded,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fd = None
+
+
 class Types:
-    def __init__(self, data: Dict):
-        assert isinstance(data, Dict)
-        self.data: Dict[str, Dict] = data
+    def __init__(self, data: Mapping, fingerprints: Optional[Mapping] = None):
+        assert isinstance(data, Mapping)
+        self.data: Mapping[str, Dict] = data
+        # Structural hash of each type, if recorded when the types were dumped
+        if fingerprints is None:
+            fingerprints = getattr(data, "fingerprints", None)
+        self.fingerprints: Optional[Mapping[str, str]] = fingerprints
 
     @classmethod
-    def from_dump(cls, path: Path):
+    def from_dump(cls, path: Path, lazy: bool = False):
         assert path.exists()
         assert path.suffix == ".jsonl"
-        with open(path, "r") as f:
+
+        if lazy:
+            # Only the name -> offset index is loaded; entries decode on access
+            logging.info(f"Indexing types from {path}")
+            return cls(LazyTypesData.from_path(path))
+
+        with open(path, "rb") as f:
             logging.info(f"Loading types from {path}")
 
             data = {}
+            fingerprints = {}
             for line in f:
                 info = json.loads(line)
                 data[info["name"]] = info
+                fingerprints[info["name"]] = get_fingerprint(line)
 
-            return cls(data)
+            return cls(data, fingerprints)
 
     @classmethod
     def from_btf_json(cls, path: Path, kind: Kind):
-        assert path.exists()
         assert path.suffix == ".json"
+        return cls.from_btf(path, kind)
+
+    @classmethod
+    def from_btf(cls, path: Path, kind: Kind):
+        # Either a raw .BTF blob or the output of `bpftool btf dump --json`
+        assert path.exists()
         from .dump import BTFNormalizer
 
         data = BTFNormalizer(path).data
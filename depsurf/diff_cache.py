@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Optional
+
+from depsurf.dep import DepKind
+from depsurf.paths import INTERMEDIATE_PATH
+from depsurf.type_store import TYPE_STORE_SECTIONS, TypeMap, load_type_map
+from depsurf.utils import InputRecord
+from depsurf.version import Version
+from depsurf.version_pair import DiffKindResult, VersionPair
+
+DIFF_CACHE_PATH = INTERMEDIATE_PATH / "diff_cache"
+
+# Bump when a differ (or diff_kind itself) changes to recompute cached results
+DIFF_VERSION = 1
+
+TYPE_STORE_ATTRS = {attr: section for section, attr in TYPE_STORE_SECTIONS.items()}
+
+# Dataset files each kind is diffed from. Packs and type maps are only read in
+# their place while they match them (see `is_source_current`). Type dumps that
+# were dropped are keyed by the digests recorded in the type map, and results
+# that would come from a pack without these files are not cached.
+DIFF_KIND_INPUTS = {
+    DepKind.FUNC: ["func_types_path"],
+    DepKind.STRUCT: ["struct_types_path"],
+    DepKind.UNION: ["union_types_path"],
+    DepKind.ENUM: ["enum_types_path"],
+    DepKind.TRACEPOINT: ["tracepoints_path"],
+    DepKind.LSM: ["struct_types_path", "func_types_path"],
+    DepKind.KFUNC: ["func_types_path", "symtab_path"],
+    DepKind.SYSCALL: ["syscalls_path"],
+    DepKind.CONFIG: ["config_path"],
+}
+
+
+# Results of VersionPair.diff_kind keyed by the digests of both versions'
+# inputs, the kind and DIFF_VERSION. Digests are only recomputed for files
+# whose size or mtime changed since they were last hashed.
+class DiffCache:
+    def __init__(self, path: Path = DIFF_CACHE_PATH):
+        self.path = path
+        self.digests_path = path / "digests.json"
+        self.records: Dict[str, InputRecord] = {}
+        self.records_changed = False
+        self.type_maps: Dict[Version, Optional[TypeMap]] = {}
+        if self.digests_path.exists():
+            with open(self.digests_path) as f:
+                self.records = {
+                    name: InputRecord(**record) for name, record in json.load(f).items()
+                }
+
+    def get_digest(self, path: Path) -> Optional[str]:
+        if not path.exists():
+            return None
+        prev = self.records.get(str(path))
+        record = InputRecord.from_path(path, prev)
+        if record is not prev:
+            self.records[str(path)] = record
+            self.records_changed = True
+        return record.sha256
+
+    def get_input_digest(self, v: Version, attr: str) -> Optional[str]:
+        path: Path = getattr(v, attr)
+        if path.exists() or attr not in TYPE_STORE_ATTRS:
+            return self.get_digest(path)
+
+        if v not in self.type_maps:
+            self.type_maps[v] = load_type_map(v.type_map_path)
+        type_map = self.type_maps[v]
+        section = TYPE_STORE_ATTRS[attr]
+        if type_map is None or section not in type_map:
+            return None
+        return type_map.sources[section]["sha256"]
+
+    def get_key(self, pair: VersionPair, kind: DepKind) -> Optional[str]:
+        attrs = DIFF_KIND_INPUTS.get(kind)
+        if attrs is None:
+            return None
+
+        digests = []
+        for v in (pair.v1, pair.v2):
+            for attr in attrs:
+                digest = self.get_input_digest(v, attr)
+                if digest is None:
+                    return None
+                digests.append(digest)
+
+        key = json.dumps([DIFF_VERSION, kind.name, digests])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get_result_path(self, kind: DepKind, key: str) -> Path:
+        return self.path / kind.name / f"{key}.pkl"
+
+    def load(self, pair: VersionPair, kind: DepKind) -> Optional[DiffKindResult]:
+        key = self.get_key(pair, kind)
+        if key is None:
+            return None
+        path = self.get_result_path(kind, key)
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            # e.g. written by an older version of the change classes
+            logging.warning(f"Ignoring unreadable {path}: {e}")
+            return None
+
+    def save(self, pair: VersionPair, kind: DepKind, result: DiffKindResult):
+        key = self.get_key(pair, kind)
+        if key is None:
+            return
+        path = self.get_result_path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.parent / f"{path.name}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def dump_digests(self):
+        if not self.records_changed:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path / f"{self.digests_path.name}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({k: vars(r) for k, r in self.records.items()}, f, indent=2)
+        os.replace(tmp_path, self.digests_path)
+        self.records_changed = False
@@ -0,0 +1,225 @@
+import json
+import logging
+import multiprocessing as mp
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from depsurf.btf import get_fingerprint
+from depsurf.dep import DepKind
+from depsurf.diff import BaseChange
+from depsurf.linux_image import LinuxImage
+from depsurf.utils import manage_result_path
+from depsurf.version import Version
+from depsurf.version_pair import DiffKindResult, DiffPairResult, VersionPair
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+VersionFingerprints = Dict[DepKind, Tuple[List[str], List[str]]]
+
+
+def load_version_fingerprints(v: Version, kinds: List[DepKind]) -> VersionFingerprints:
+    results = {}
+    for kind in kinds:
+        data = v.img.get_all_by_kind(kind)
+        fingerprints = v.img.get_fingerprints_by_kind(kind) or {}
+        names = list(data)
+        results[kind] = (
+            names,
+            [
+                fingerprints.get(name)
+                # Kinds without stored fingerprints hash the same way as dumps
+                or get_fingerprint(json.dumps(data[name]).encode())
+                for name in names
+            ],
+        )
+
+    LinuxImage.cache.pop(v, None)
+    v.__dict__.pop("img", None)
+    return results
+
+
+# Fingerprints of each name of a kind across versions: ids[row, col] identifies
+# the fingerprint of names[row] in versions[col], or is -1 if it is absent
+@dataclass
+class Timeline:
+    names: List[str]
+    ids: np.ndarray
+
+    @property
+    def present(self) -> np.ndarray:
+        return self.ids >= 0
+
+
+def build_timeline(columns: List[Tuple[List[str], List[str]]]) -> Timeline:
+    rows: Dict[str, int] = {}
+    fp_index: Dict[str, int] = {}
+    cells = []
+    for names, fingerprints in columns:
+        row_ids = np.array([rows.setdefault(name, len(rows)) for name in names])
+        fp_ids = np.array(
+            [fp_index.setdefault(fp, len(fp_index)) for fp in fingerprints]
+        )
+        cells.append((row_ids, fp_ids))
+
+    ids = np.full((len(rows), len(columns)), -1, dtype=np.int32)
+    for col, (row_ids, fp_ids) in enumerate(cells):
+        if len(row_ids):
+            ids[row_ids, col] = fp_ids
+    return Timeline(names=list(rows), ids=ids)
+
+
+# Diffs between any two versions, derived from per-name fingerprint timelines
+# built with one pass over each version instead of one diff per pair
+class DiffMatrix:
+    def __init__(self, versions: List[Version], timelines: Dict[DepKind, Timeline]):
+        self.versions = versions
+        self.timelines = timelines
+        self.columns = {v: col for col, v in enumerate(versions)}
+
+    @classmethod
+    def from_versions(
+        cls,
+        versions: List[Version],
+        kinds: List[DepKind],
+        num_workers: Optional[int] = None,
+    ) -> "DiffMatrix":
+        num_workers = num_workers or mp.cpu_count()
+        versions = list(versions)
+
+        columns: Dict[DepKind, List] = {kind: [] for kind in kinds}
+
+        def add(results: VersionFingerprints):
+            for kind, column in results.items():
+                columns[kind].append(column)
+
+        if num_workers == 1 or len(versions) <= 1:
+            for v in versions:
+                logging.info(f"Loading fingerprints of {v}")
+                add(load_version_fingerprints(v, kinds))
+        else:
+            with mp.get_context("fork").Pool(min(num_workers, len(versions))) as pool:
+                args = [(v, kinds) for v in versions]
+                for results in pool.starmap(load_version_fingerprints, args):
+                    add(results)
+
+        timelines = {kind: build_timeline(columns[kind]) for kind in kinds}
+        return cls(versions, timelines)
+
+    @classmethod
+    def load(cls, path: Path) -> "DiffMatrix":
+        with open(path, "rb") as f:
+            versions, timelines = pickle.load(f)
+        return cls(versions, timelines)
+
+    def get_columns(self, v1: Version, v2: Version, kind: DepKind):
+        timeline = self.timelines[kind]
+        return timeline.ids[:, self.columns[v1]], timeline.ids[:, self.columns[v2]]
+
+    def get_names(
+        self, v1: Version, v2: Version, kind: DepKind
+    ) -> Tuple[List[str], List[str], List[str]]:
+        # Added, removed and structurally changed names from v1 to v2. A changed
+        # name may still have no changes that `kind.differ` reports.
+        col1, col2 = self.get_columns(v1, v2, kind)
+        names = self.timelines[kind].names
+
+        def select(mask: np.ndarray) -> List[str]:
+            return [names[row] for row in np.flatnonzero(mask)]
+
+        return (
+            select((col1 < 0) & (col2 >= 0)),
+            select((col1 >= 0) & (col2 < 0)),
+            select((col1 >= 0) & (col2 >= 0) & (col1 != col2)),
+        )
+
+    def diff_kind(self, v1: Version, v2: Version, kind: DepKind) -> DiffKindResult:
+        # Same result as VersionPair.diff_kind; only the entries that were
+        # added, removed or changed are decoded
+        added, removed, changed = self.get_names(v1, v2, kind)
+        col1, col2 = self.get_columns(v1, v2, kind)
+        dict1 = v1.img.get_all_by_kind(kind)
+        dict2 = v2.img.get_all_by_kind(kind)
+
+        changes: Dict[str, List[BaseChange]] = {}
+        for name in changed:
+            old, new = dict1[name], dict2[name]
+            if old == new:
+                continue
+            result = kind.differ(old, new)
+            if result:
+                changes[name] = result
+
+        return DiffKindResult(
+            kind=kind,
+            old_len=int((col1 >= 0).sum()),
+            new_len=int((col2 >= 0).sum()),
+            added={name: dict2[name] for name in added},
+            removed={name: dict1[name] for name in removed},
+            changed=changes,
+        )
+
+    def diff_pair(self, pair: VersionPair, kinds: List[DepKind]) -> DiffPairResult:
+        return DiffPairResult(
+            pair.v1,
+            pair.v2,
+            {kind: self.diff_kind(pair.v1, pair.v2, kind) for kind in kinds},
+        )
+
+    def get_counts(self, kind: DepKind) -> Dict[str, np.ndarray]:
+        # [i, j] is the number of names added, removed or structurally changed
+        # from versions[i] to versions[j]
+        ids = self.timelines[kind].ids
+        present = (ids >= 0).astype(np.int64)
+        both = present.T @ present
+        added = (1 - present).T @ present
+
+        same = np.zeros_like(both)
+        for col in range(ids.shape[1]):
+            equal = (ids == ids[:, [col]]) & (ids >= 0)
+            same[col] = equal.sum(axis=0)
+
+        return {"added": added, "removed": added.T, "changed": both - same}
+
+    def to_frame(self) -> "pd.DataFrame":
+        # One row per (kind, v1, v2) with the counts of get_counts
+        import pandas as pd
+
+        frames = []
+        names = [v.name for v in self.versions]
+        for kind in self.timelines:
+            index = pd.MultiIndex.from_product(
+                [[str(kind)], names, names], names=["kind", "v1", "v2"]
+            )
+            counts = self.get_counts(kind)
+            frames.append(
+                pd.DataFrame(
+                    {key: value.ravel() for key, value in counts.items()}, index=index
+                )
+            )
+        return pd.concat(frames)
+
+    def dump(self, path: Path):
+        with open(path, "wb") as f:
+            pickle.dump(
+                (self.versions, self.timelines), f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+
+@manage_result_path
+def dump_diff_matrix(
+    versions: List[Version],
+    kinds: List[DepKind],
+    result_path: Path,
+    num_workers: Optional[int] = None,
+):
+    DiffMatrix.from_versions(versions, kinds, num_workers).dump(result_path)
+
+
+@manage_result_path
+def export_diff_matrix(matrix: DiffMatrix, result_path: Path):
+    matrix.to_frame().to_csv(result_path)
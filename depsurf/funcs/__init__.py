@@ -1,5 +1,6 @@
 from .dwarf import *
 from .dwarf_dump import *
+from .dwarf_reader import *
 from .entry import *
 from .group import *
 from .groups import *
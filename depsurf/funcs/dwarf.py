@@ -6,6 +6,8 @@ from typing import Callable, Optional
 from elftools.dwarf.die import DIE
 from elftools.dwarf.enums import ENUM_DW_TAG
 
+from .dwarf_reader import DIEReader
+
 KERNEL_DIR = {
     "arch",
     "block",
@@ -56,7 +58,13 @@ class DIEHandler:
 
 
 class Traverser:
-    def __init__(self, top_die: DIE, handler_map: dict[str, DIEHandler]):
+    def __init__(
+        self,
+        top_die: DIE,
+        handler_map: dict[str, DIEHandler],
+        raw: bool = True,
+        cache_size: int = 4096,
+    ):
         assert top_die.tag == "DW_TAG_compile_unit"
         self.top_die = top_die
 
@@ -77,8 +85,16 @@ class Traverser:
 
         self.num_indent = 0
 
+        # Decode DIEs with DIEReader instead of pyelftools for traverse()
+        self.raw = raw
+        self.cache_size = cache_size
+
     def traverse(self):
-        self.traverse_impl(self.top_die)
+        if self.raw:
+            reader = DIEReader(self.top_die.cu, self.cache_size)
+            self.traverse_impl(reader.get_top_DIE())
+        else:
+            self.traverse_impl(self.top_die)
 
     def traverse_impl(self, die: DIE):
         handler = self.handler_map.get(die.tag)
@@ -1,8 +1,19 @@
+import bisect
 import dataclasses
+import heapq
+import itertools
 import json
 import logging
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from elftools.dwarf.compileunit import CompileUnit
 from elftools.dwarf.die import DIE
@@ -11,7 +22,7 @@ from elftools.elf.elffile import ELFFile
 
 from depsurf.utils import manage_result_path
 
-from .dwarf import DIEHandler, Traverser, get_name
+from .dwarf import DIEHandler, Traverser, get_name, normalize_compile_path
 from .entry import FuncEntry, InlineStatus
 
 
@@ -24,13 +35,41 @@ def get_pc(die: DIE) -> int:
     return 0
 
 
+FuncEntryGroup = Dict[Tuple[Optional[str], Optional[str]], FuncEntry]
+
+
+def merge_group(group: FuncEntryGroup, other: FuncEntryGroup):
+    for key, entry in other.items():
+        curr_entry = group.get(key)
+        if curr_entry is None:
+            group[key] = entry
+        else:
+            curr_entry.merge(entry)
+
+
+def count_records(data: Dict[str, FuncEntryGroup]) -> int:
+    return sum(
+        1 + len(entry.caller_inline) + len(entry.caller_func)
+        for group in data.values()
+        for entry in group.values()
+    )
+
+
 class FunctionRecorder:
-    def __init__(self):
-        self.data: Dict[str, Dict[Tuple[Optional[str], Optional[str]], FuncEntry]] = {}
+    def __init__(self, spill: Optional["FuncEntrySpill"] = None):
+        self.data: Dict[str, FuncEntryGroup] = {}
         self.curr_prog = None
+        self.spill = spill
+        # Number of entries and callers held in self.data
+        self.num_records = 0
+
+    def iter_groups(self):
+        if self.spill is None:
+            return iter(self.data.values())
+        return self.spill.iter_groups(self.data)
 
     def iter_funcs(self):
-        for name, group in self.data.items():
+        for group in self.iter_groups():
             for loc, func in group.items():
                 if func.name.startswith("__compiletime_assert_"):
                     continue
@@ -65,6 +104,7 @@ class FunctionRecorder:
             file=file,
         )
         group[key] = entry
+        self.num_records += 1
 
         return entry
 
@@ -151,12 +191,20 @@ class FunctionRecorder:
         else:
             # it is possible that entry.name == caller_name (e.g., recursive call)
             entry.caller_func.append(caller_loc)
+        self.num_records += 1
 
         return entry
 
     @classmethod
-    def from_cus(cls, cus: List[CompileUnit], debug=False):
-        obj = cls()
+    def from_cus(
+        cls,
+        cus: List[CompileUnit],
+        debug=False,
+        obj: Optional["FunctionRecorder"] = None,
+        checkpoint: Optional["RecorderCheckpoint"] = None,
+    ):
+        if obj is None:
+            obj = cls()
         handler_map = {
             "DW_TAG_compile_unit": DIEHandler(rec=True),
             "DW_TAG_lexical_block": DIEHandler(rec=True),
@@ -172,49 +220,365 @@ class FunctionRecorder:
             top_die = cu.get_top_DIE()
             lang = top_die.attributes["DW_AT_language"].value
             if lang == 0x001C:  #  # ignore DW_LANG_Rust
-                logging.info(f"Ignoring {i + 1}/{len(cus)}: {traverser.path}")
-                continue
-
-            traverser = Traverser(top_die, handler_map)
-            logging.debug(f"Traversing {i + 1}/{len(cus)}: {traverser.path}")
-            if debug:
-                traverser.traverse_debug()
+                path = normalize_compile_path(top_die.get_full_path())
+                logging.info(f"Ignoring {i + 1}/{len(cus)}: {path}")
             else:
-                traverser.traverse()
+                traverser = Traverser(top_die, handler_map)
+                logging.debug(f"Traversing {i + 1}/{len(cus)}: {traverser.path}")
+                if debug:
+                    traverser.traverse_debug()
+                else:
+                    traverser.traverse()
+
+            obj.maybe_spill()
+            if checkpoint is not None:
+                checkpoint.maybe_save(obj, cu.cu_offset + 1)
 
         return obj
 
     @classmethod
-    def from_path(cls, path: Path, cus_mapper=None, debug=False):
+    def from_path(
+        cls,
+        path: Path,
+        cus_mapper=None,
+        cu_offsets: Optional[List[int]] = None,
+        debug=False,
+        checkpoint: Optional["RecorderCheckpoint"] = None,
+        spill: Optional["FuncEntrySpill"] = None,
+    ):
         logging.info(f"Dumping functions from {path}")
+
+        obj = cls(spill=spill)
+        resume_offset = 0 if checkpoint is None else checkpoint.load(obj)
+
         with path.open("rb") as f:
             elffile = ELFFile(f)
             dwarfinfo = elffile.get_dwarf_info(relocate_dwarf_sections=False)
-            cus = dwarfinfo.iter_CUs()
+            if cu_offsets is None:
+                cus = dwarfinfo.iter_CUs()
+            else:
+                cus = (dwarfinfo.get_CU_at(offset) for offset in cu_offsets)
+            if resume_offset:
+                cus = itertools.dropwhile(lambda cu: cu.cu_offset < resume_offset, cus)
             if cus_mapper is not None:
                 cus = cus_mapper(cus)
-            obj = cls.from_cus(cus, debug=debug)
+            obj = cls.from_cus(cus, debug=debug, obj=obj, checkpoint=checkpoint)
+            cache: Optional[DWARFCache] = getattr(dwarfinfo, "lru_cache", None)
+            if cache is not None:
+                logging.info(f"DIE cache: {cache.dies}")
+                logging.info(f"CU cache: {cache.cus}")
             del dwarfinfo
             del elffile
         return obj
 
+    @classmethod
+    def from_path_parallel(
+        cls,
+        path: Path,
+        num_workers: int,
+        num_shards=None,
+        checkpoint: Optional["RecorderCheckpoint"] = None,
+        spill: Optional["FuncEntrySpill"] = None,
+    ):
+        # Shard .debug_info into contiguous byte ranges so that merging the
+        # shards in order reproduces the sequential traversal. The CU offsets
+        # are found once here, so that workers go straight to their first CU.
+        size, cu_offsets = get_cu_offsets(path)
+
+        num_shards = num_shards or num_workers * 4
+        bounds = [size * i // num_shards for i in range(num_shards + 1)]
+
+        obj = cls(spill=spill)
+        resume_offset = 0 if checkpoint is None else checkpoint.load(obj)
+        shards = []
+        for start, end in zip(bounds, bounds[1:]):
+            lo = bisect.bisect_left(cu_offsets, max(start, resume_offset))
+            hi = bisect.bisect_left(cu_offsets, end)
+            if lo < hi:
+                shards.append((end, cu_offsets[lo:hi]))
+
+        logging.info(f"Dumping functions from {path} in {len(shards)} shards")
+        with mp.Pool(num_workers) as pool:
+            worker = partial(record_cus, path, DWARF_CACHE_SIZES.copy())
+            offsets = [shard_offsets for _, shard_offsets in shards]
+            for (end, _), data in zip(shards, pool.imap(worker, offsets)):
+                obj.merge(data)
+                obj.maybe_spill()
+                if checkpoint is not None:
+                    checkpoint.maybe_save(obj, end)
+        return obj
+
+    def merge(self, data: Dict[str, FuncEntryGroup]):
+        for name, group in data.items():
+            merge_group(self.data.setdefault(name, {}), group)
+        self.num_records += count_records(data)
+
+    def maybe_spill(self):
+        if self.spill is None or self.num_records < self.spill.max_records:
+            return
+        self.spill.write_run(self.data)
+        self.data = {}
+        self.num_records = 0
+
     def dump(self, path: Path):
         with open(path, "w") as f:
             for func in self.iter_funcs():
                 print(json.dumps(dataclasses.asdict(func)), file=f)
 
 
-def disable_dwarf_cache():
+# Bounds the memory of a FunctionRecorder by moving its groups to sorted runs on
+# disk. Runs are ordered by when each name was first seen, so merging them gives
+# the same output as keeping everything in memory.
+class FuncEntrySpill:
+    def __init__(self, path: Path, max_records: int):
+        self.path = path
+        self.max_records = max_records
+        self.first_seen: Dict[str, int] = {}
+        self.num_runs = 0
+
+    def get_run_path(self, idx: int) -> Path:
+        return self.path / f"{idx}.pkl"
+
+    def sort_groups(self, data: Dict[str, FuncEntryGroup]):
+        for name in data:
+            self.first_seen.setdefault(name, len(self.first_seen))
+        return sorted(
+            ((self.first_seen[name], group) for name, group in data.items()),
+            key=lambda item: item[0],
+        )
+
+    def write_run(self, data: Dict[str, FuncEntryGroup]):
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.get_run_path(self.num_runs)
+        logging.debug(f"Spilling {len(data)} groups to {path}")
+        with open(path, "wb") as f:
+            for item in self.sort_groups(data):
+                pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.num_runs += 1
+
+    def read_run(self, idx: int):
+        with open(self.get_run_path(idx), "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def iter_groups(self, data: Dict[str, FuncEntryGroup]):
+        runs = [self.read_run(idx) for idx in range(self.num_runs)]
+        runs.append(iter(self.sort_groups(data)))
+        # Ties are broken by run order, i.e. in the order the CUs were traversed
+        merged = heapq.merge(*runs, key=lambda item: item[0])
+        for _, items in itertools.groupby(merged, key=lambda item: item[0]):
+            group: FuncEntryGroup = {}
+            for _, run_group in items:
+                merge_group(group, run_group)
+            yield group
+
+    def get_state(self):
+        return self.first_seen, self.num_runs
+
+    def set_state(self, state):
+        self.first_seen, self.num_runs = state
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+# Periodically pickles the recorder state together with the offset below which
+# all CUs have been traversed, so that an interrupted dump can pick up from there
+class RecorderCheckpoint:
+    def __init__(self, path: Path, elf_path: Path, interval: float = 600):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+        stat = elf_path.stat()
+        self.source = (str(elf_path), stat.st_size, stat.st_mtime_ns)
+
+    def load(self, obj: FunctionRecorder) -> int:
+        if not self.path.exists():
+            return 0
+
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state["source"] != self.source:
+            logging.warning(f"Ignoring stale checkpoint {self.path}")
+            return 0
+        # Groups already spilled are only in the runs, not in the saved data
+        if (obj.spill is None) != (state["spill"] is None):
+            logging.warning(f"Ignoring checkpoint {self.path} with other spill mode")
+            return 0
+
+        obj.data = state["data"]
+        obj.num_records = count_records(obj.data)
+        if obj.spill is not None:
+            obj.spill.set_state(state["spill"])
+        logging.info(f"Resuming from {self.path} at offset {state['offset']:#x}")
+        return state["offset"]
+
+    def maybe_save(self, obj: FunctionRecorder, offset: int):
+        if time.monotonic() - self.last_save < self.interval:
+            return
+        self.save(obj, offset)
+
+    def save(self, obj: FunctionRecorder, offset: int):
+        state = {
+            "source": self.source,
+            "offset": offset,
+            "data": obj.data,
+            "spill": None if obj.spill is None else obj.spill.get_state(),
+        }
+        tmp_path = self.path.parent / f"{self.path.name}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.last_save = time.monotonic()
+        logging.debug(f"Saved checkpoint {self.path} at offset {offset:#x}")
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+def get_cu_offsets(path: Path) -> Tuple[int, List[int]]:
+    # Size of .debug_info and the offsets of its CUs, found by following the
+    # unit lengths rather than parsing every CU header
+    with path.open("rb") as f:
+        elffile = ELFFile(f)
+        debug_info = elffile.get_section_by_name(".debug_info")
+        assert debug_info is not None, f"No .debug_info in {path}"
+        size = debug_info.data_size
+        if debug_info.compressed:
+            dwarfinfo = elffile.get_dwarf_info(relocate_dwarf_sections=False)
+            return size, [cu.cu_offset for cu in dwarfinfo.iter_CUs()]
+
+        byteorder = "little" if elffile.little_endian else "big"
+        offsets = []
+        offset = 0
+        while offset < size:
+            offsets.append(offset)
+            f.seek(debug_info["sh_offset"] + offset)
+            length = int.from_bytes(f.read(4), byteorder)
+            if length == 0xFFFFFFFF:  # 64-bit DWARF
+                offset += 12 + int.from_bytes(f.read(8), byteorder)
+            else:
+                offset += 4 + length
+        return size, offsets
+
+
+def record_cus(path: Path, cache_sizes: Dict[str, int], cu_offsets: List[int]):
+    limit_dwarf_cache(**cache_sizes)
+    return FunctionRecorder.from_path(path, cu_offsets=cu_offsets).data
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.data: OrderedDict[Any, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load: Callable[[], Any]):
+        value = self.data.get(key)
+        if value is not None:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = load()
+        if self.max_size > 0:
+            self.data[key] = value
+            if len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+        return value
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return (
+            f"{len(self.data)}/{self.max_size} entries, "
+            f"{self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
+        )
+
+
+@dataclass
+class DWARFCache:
+    dies: LRUCache
+    cus: LRUCache
+
+
+DWARF_CACHE_SIZES = {"die_cache_size": 0, "cu_cache_size": 0}
+
+
+def get_dwarf_cache(dwarfinfo: DWARFInfo) -> DWARFCache:
+    cache = getattr(dwarfinfo, "lru_cache", None)
+    if cache is None:
+        cache = DWARFCache(
+            dies=LRUCache(DWARF_CACHE_SIZES["die_cache_size"]),
+            cus=LRUCache(DWARF_CACHE_SIZES["cu_cache_size"]),
+        )
+        dwarfinfo.lru_cache = cache
+    return cache
+
+
+# pyelftools keeps every DIE and CU it parses, which does not fit in memory for
+# a kernel. Replace both caches with LRUs of the given sizes (0 disables them).
+def limit_dwarf_cache(die_cache_size: int = 4096, cu_cache_size: int = 16):
+    DWARF_CACHE_SIZES["die_cache_size"] = die_cache_size
+    DWARF_CACHE_SIZES["cu_cache_size"] = cu_cache_size
+
     def _get_cached_DIE(self: CompileUnit, offset):
-        top_die_stream = self.get_top_DIE().stream
-        return DIE(cu=self, stream=top_die_stream, offset=offset)
+        def load():
+            top_die_stream = self.get_top_DIE().stream
+            return DIE(cu=self, stream=top_die_stream, offset=offset)
+
+        return get_dwarf_cache(self.dwarfinfo).dies.get(offset, load)
+
+    def _cached_CU_at_offset(self: DWARFInfo, offset):
+        load = partial(self._parse_CU_at_offset, offset)
+        return get_dwarf_cache(self).cus.get(offset, load)
 
     CompileUnit._get_cached_DIE = _get_cached_DIE
-    DWARFInfo._cached_CU_at_offset = DWARFInfo._parse_CU_at_offset
+    DWARFInfo._cached_CU_at_offset = _cached_CU_at_offset
+
+
+def disable_dwarf_cache():
+    limit_dwarf_cache(die_cache_size=0, cu_cache_size=0)
 
 
 @manage_result_path
-def dump_func_entries(path: Path, result_path: Path):
-    disable_dwarf_cache()
+def dump_func_entries(
+    path: Path,
+    result_path: Path,
+    num_workers: int = 1,
+    checkpoint_interval: Optional[float] = 600,
+    max_records: Optional[int] = None,
+    die_cache_size: int = 4096,
+    cu_cache_size: int = 16,
+):
+    limit_dwarf_cache(die_cache_size, cu_cache_size)
+
+    # result_path is the temporary file, so key the checkpoint off the final name
+    checkpoint = None
+    if checkpoint_interval is not None:
+        checkpoint = RecorderCheckpoint(
+            result_path.with_suffix(".ckpt"), path, checkpoint_interval
+        )
 
-    FunctionRecorder.from_path(path).dump(result_path)
+    spill = None
+    if max_records is not None:
+        spill = FuncEntrySpill(result_path.with_suffix(".runs"), max_records)
+
+    if num_workers > 1:
+        recorder = FunctionRecorder.from_path_parallel(
+            path, num_workers, checkpoint=checkpoint, spill=spill
+        )
+    else:
+        recorder = FunctionRecorder.from_path(path, checkpoint=checkpoint, spill=spill)
+    recorder.dump(result_path)
+
+    if checkpoint is not None:
+        checkpoint.remove()
+    if spill is not None:
+        spill.remove()
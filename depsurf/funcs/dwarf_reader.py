@@ -0,0 +1,484 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from elftools.dwarf.compileunit import CompileUnit
+from elftools.dwarf.die import DIE
+from elftools.dwarf.enums import ENUM_DW_FORM
+
+# Attributes read by the FunctionRecorder handlers; all others are skipped
+# without being decoded
+WANTED_ATTRS = {
+    "DW_AT_name",
+    "DW_AT_external",
+    "DW_AT_declaration",
+    "DW_AT_inline",
+    "DW_AT_abstract_origin",
+    "DW_AT_call_origin",
+    "DW_AT_decl_file",
+    "DW_AT_decl_line",
+    "DW_AT_low_pc",
+    "DW_AT_entry_pc",
+    "DW_AT_high_pc",
+    "DW_AT_sibling",
+}
+
+FORM_NAMES = {
+    code: name for name, code in ENUM_DW_FORM.items() if isinstance(code, int)
+}
+
+# How an attribute value is laid out in .debug_info
+(
+    K_FIXED,
+    K_ULEB,
+    K_SLEB,
+    K_CSTR,
+    K_BLOCK,
+    K_CONST,
+    K_FLAG_PRESENT,
+    K_INDIRECT,
+) = range(8)
+
+FIXED_FORMS = {
+    "DW_FORM_data1": 1,
+    "DW_FORM_data2": 2,
+    "DW_FORM_data4": 4,
+    "DW_FORM_data8": 8,
+    "DW_FORM_data16": 16,
+    "DW_FORM_ref1": 1,
+    "DW_FORM_ref2": 2,
+    "DW_FORM_ref4": 4,
+    "DW_FORM_ref8": 8,
+    "DW_FORM_ref_sig8": 8,
+    "DW_FORM_ref_sup4": 4,
+    "DW_FORM_ref_sup8": 8,
+    "DW_FORM_flag": 1,
+    "DW_FORM_strx1": 1,
+    "DW_FORM_strx2": 2,
+    "DW_FORM_strx3": 3,
+    "DW_FORM_strx4": 4,
+    "DW_FORM_addrx1": 1,
+    "DW_FORM_addrx2": 2,
+    "DW_FORM_addrx3": 3,
+    "DW_FORM_addrx4": 4,
+}
+OFFSET_FORMS = {
+    "DW_FORM_strp",
+    "DW_FORM_line_strp",
+    "DW_FORM_sec_offset",
+    "DW_FORM_strp_sup",
+    "DW_FORM_GNU_ref_alt",
+    "DW_FORM_GNU_strp_alt",
+}
+ULEB_FORMS = {
+    "DW_FORM_udata",
+    "DW_FORM_ref_udata",
+    "DW_FORM_strx",
+    "DW_FORM_addrx",
+    "DW_FORM_loclistx",
+    "DW_FORM_rnglistx",
+    "DW_FORM_GNU_addr_index",
+    "DW_FORM_GNU_str_index",
+}
+BLOCK_FORMS = {
+    "DW_FORM_block1": 1,
+    "DW_FORM_block2": 2,
+    "DW_FORM_block4": 4,
+    "DW_FORM_block": 0,
+    "DW_FORM_exprloc": 0,
+}
+
+INT_FORMS = {
+    "DW_FORM_data1",
+    "DW_FORM_data2",
+    "DW_FORM_data4",
+    "DW_FORM_data8",
+    "DW_FORM_udata",
+    "DW_FORM_sdata",
+    "DW_FORM_implicit_const",
+    "DW_FORM_addr",
+    "DW_FORM_sec_offset",
+}
+LOCAL_REF_FORMS = {
+    "DW_FORM_ref1",
+    "DW_FORM_ref2",
+    "DW_FORM_ref4",
+    "DW_FORM_ref8",
+    "DW_FORM_ref_udata",
+}
+STRX_FORMS = {
+    "DW_FORM_strx",
+    "DW_FORM_strx1",
+    "DW_FORM_strx2",
+    "DW_FORM_strx3",
+    "DW_FORM_strx4",
+}
+ADDRX_FORMS = {
+    "DW_FORM_addrx",
+    "DW_FORM_addrx1",
+    "DW_FORM_addrx2",
+    "DW_FORM_addrx3",
+    "DW_FORM_addrx4",
+}
+# Wanted attributes in these forms are decoded; any other form makes the
+# reader hand the DIE to pyelftools
+DECODED_FORMS = (
+    INT_FORMS
+    | LOCAL_REF_FORMS
+    | STRX_FORMS
+    | ADDRX_FORMS
+    | {
+        "DW_FORM_string",
+        "DW_FORM_strp",
+        "DW_FORM_line_strp",
+        "DW_FORM_flag",
+        "DW_FORM_flag_present",
+        "DW_FORM_ref_addr",
+    }
+)
+
+
+class RawAttribute(NamedTuple):
+    form: str
+    value: Any
+    raw_value: Any
+
+
+# Spec of one attribute in an abbreviation: the attribute name if it is wanted,
+# its form, the layout kind and a size (or constant for implicit_const)
+AttrSpec = Tuple[Optional[str], str, int, int]
+
+
+class Abbrev(NamedTuple):
+    tag: str
+    has_children: bool
+    specs: List[AttrSpec]
+    # Whether a wanted attribute uses a form we don't decode
+    slow: bool
+
+
+# Minimal stand-in for pyelftools' DIE holding only the wanted attributes
+class RawDIE:
+    __slots__ = ("reader", "offset", "tag", "has_children", "attributes", "size", "end")
+
+    def __init__(self, reader, offset, tag, has_children, attributes, size):
+        self.reader: DIEReader = reader
+        self.offset: int = offset
+        self.tag: str = tag
+        self.has_children: bool = has_children
+        self.attributes: Dict[str, Any] = attributes
+        self.size: int = size
+        # Offset past the DIE and all its children, once known
+        self.end: Optional[int] = None
+
+    def get_DIE_from_attribute(self, name: str):
+        return self.reader.get_DIE_from_attribute(self, name)
+
+    def iter_children(self) -> Iterator["RawDIE"]:
+        return self.reader.iter_children(self)
+
+    def __repr__(self):
+        return f"RawDIE({self.offset:#x}, {self.tag})"
+
+
+# Decodes DIEs of a CU straight from the .debug_info buffer using its
+# abbreviation table. Only WANTED_ATTRS are materialized, and subtrees that are
+# not visited are skipped via DW_AT_sibling where available.
+class DIEReader:
+    def __init__(self, cu: CompileUnit, cache_size: int = 4096):
+        self.cu = cu
+        self.dwarfinfo = cu.dwarfinfo
+        self.data = self.dwarfinfo.debug_info_sec.stream.getbuffer()
+        self.byteorder = "little" if self.dwarfinfo.config.little_endian else "big"
+
+        self.version: int = cu["version"]
+        self.address_size: int = cu["address_size"]
+        self.offset_size = 4 if cu.dwarf_format() == 32 else 8
+        self.start = cu.cu_die_offset
+        self.end = cu.cu_offset + cu.size
+
+        self.abbrev_table = cu.get_abbrev_table()
+        self.abbrevs: Dict[int, Abbrev] = {}
+
+        # For the DWARF 5 string index forms
+        base = cu.get_top_DIE().attributes.get("DW_AT_str_offsets_base")
+        self.str_offsets_base: Optional[int] = None if base is None else base.value
+        section = self.dwarfinfo.debug_str_offsets_sec
+        self.str_offsets = None if section is None else section.stream.getbuffer()
+
+        # Bounded LRU of DIEs reached through DW_AT_abstract_origin and friends
+        self.cache: OrderedDict[int, Any] = OrderedDict()
+        self.cache_size = cache_size
+        self.other_readers: Dict[int, "DIEReader"] = {}
+
+    def get_abbrev(self, code: int) -> Abbrev:
+        abbrev = self.abbrevs.get(code)
+        if abbrev is not None:
+            return abbrev
+
+        decl = self.abbrev_table.get_abbrev(code)
+        specs: List[AttrSpec] = []
+        slow = False
+        for spec in decl["attr_spec"]:
+            name = spec.name if spec.name in WANTED_ATTRS else None
+            form = spec.form
+            if name is not None and form not in DECODED_FORMS:
+                slow = True
+            kind, size = self.get_layout(form)
+            if kind == K_CONST:
+                size = spec.value
+            # Merge runs of skipped fixed-size attributes into a single skip
+            if (
+                name is None
+                and kind == K_FIXED
+                and specs
+                and specs[-1][0] is None
+                and specs[-1][2] == K_FIXED
+            ):
+                specs[-1] = (None, form, K_FIXED, specs[-1][3] + size)
+            else:
+                specs.append((name, form, kind, size))
+
+        abbrev = Abbrev(decl["tag"], decl.has_children(), specs, slow)
+        self.abbrevs[code] = abbrev
+        return abbrev
+
+    def get_layout(self, form: str) -> Tuple[int, int]:
+        size = FIXED_FORMS.get(form)
+        if size is not None:
+            return K_FIXED, size
+        if form == "DW_FORM_addr":
+            return K_FIXED, self.address_size
+        if form == "DW_FORM_ref_addr":
+            return K_FIXED, self.address_size if self.version == 2 else self.offset_size
+        if form in OFFSET_FORMS:
+            return K_FIXED, self.offset_size
+        if form in ULEB_FORMS:
+            return K_ULEB, 0
+        if form == "DW_FORM_sdata":
+            return K_SLEB, 0
+        if form == "DW_FORM_string":
+            return K_CSTR, 0
+        if form in BLOCK_FORMS:
+            return K_BLOCK, BLOCK_FORMS[form]
+        if form == "DW_FORM_implicit_const":
+            return K_CONST, 0
+        if form == "DW_FORM_flag_present":
+            return K_FLAG_PRESENT, 0
+        if form == "DW_FORM_indirect":
+            return K_INDIRECT, 0
+        raise NotImplementedError(f"Unsupported form {form}")
+
+    def read_uint(self, pos: int, size: int) -> int:
+        return int.from_bytes(self.data[pos : pos + size], self.byteorder)
+
+    def read_uleb(self, pos: int) -> Tuple[int, int]:
+        data = self.data
+        result = 0
+        shift = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result, pos
+            shift += 7
+
+    def read_sleb(self, pos: int) -> Tuple[int, int]:
+        start = pos
+        result, pos = self.read_uleb(pos)
+        bits = 7 * (pos - start)
+        if result & (1 << (bits - 1)):
+            result -= 1 << bits
+        return result, pos
+
+    def read_cstr(self, pos: int) -> Tuple[bytes, int]:
+        data = self.data
+        end = pos
+        while data[end]:
+            end += 1
+        return bytes(data[pos:end]), end + 1
+
+    def skip_value(self, kind: int, size: int, pos: int) -> int:
+        if kind == K_FIXED:
+            return pos + size
+        if kind == K_ULEB or kind == K_SLEB:
+            data = self.data
+            while data[pos] >= 0x80:
+                pos += 1
+            return pos + 1
+        if kind == K_CSTR:
+            return self.read_cstr(pos)[1]
+        if kind == K_BLOCK:
+            if size:
+                length = self.read_uint(pos, size)
+                pos += size
+            else:
+                length, pos = self.read_uleb(pos)
+            return pos + length
+        if kind == K_INDIRECT:
+            form_code, pos = self.read_uleb(pos)
+            kind, size = self.get_layout(FORM_NAMES[form_code])
+            return self.skip_value(kind, size, pos)
+        return pos
+
+    def decode_value(self, form: str, kind: int, size: int, pos: int):
+        if kind == K_CONST:
+            return size, size, pos
+        if kind == K_FLAG_PRESENT:
+            return True, True, pos
+        if kind == K_CSTR:
+            value, pos = self.read_cstr(pos)
+            return value, value, pos
+        if kind == K_ULEB:
+            raw, pos = self.read_uleb(pos)
+        elif kind == K_SLEB:
+            raw, pos = self.read_sleb(pos)
+        else:
+            raw = self.read_uint(pos, size)
+            pos += size
+
+        if form == "DW_FORM_strp":
+            return self.dwarfinfo.get_string_from_table(raw), raw, pos
+        if form == "DW_FORM_line_strp":
+            return self.dwarfinfo.get_string_from_linetable(raw), raw, pos
+        if form == "DW_FORM_flag":
+            return raw != 0, raw, pos
+        if form in STRX_FORMS:
+            return self.get_strx(raw), raw, pos
+        if form in ADDRX_FORMS:
+            return self.dwarfinfo.get_addr(self.cu, raw), raw, pos
+        return raw, raw, pos
+
+    def get_strx(self, idx: int) -> bytes:
+        assert self.str_offsets_base is not None, "Missing DW_AT_str_offsets_base"
+        pos = self.str_offsets_base + idx * self.offset_size
+        offset = int.from_bytes(
+            self.str_offsets[pos : pos + self.offset_size], self.byteorder
+        )
+        return self.dwarfinfo.get_string_from_table(offset)
+
+    def parse(self, offset: int, decode: bool):
+        # Returns (abbrev, attributes, end of attributes), or (None, None, end)
+        # for a null entry. Attributes are only decoded if requested, except
+        # for DW_AT_sibling which is needed for skipping.
+        code, pos = self.read_uleb(offset)
+        if code == 0:
+            return None, None, pos
+
+        abbrev = self.get_abbrev(code)
+        if decode and abbrev.slow:
+            return abbrev, None, pos
+
+        attrs: Dict[str, RawAttribute] = {}
+        for name, form, kind, size in abbrev.specs:
+            if name is None or (not decode and name != "DW_AT_sibling"):
+                pos = self.skip_value(kind, size, pos)
+                continue
+            value, raw, pos = self.decode_value(form, kind, size, pos)
+            attrs[name] = RawAttribute(form, value, raw)
+        return abbrev, attrs, pos
+
+    def read(self, offset: int):
+        abbrev, attrs, pos = self.parse(offset, decode=True)
+        if abbrev is None:
+            return None
+        if abbrev.slow:
+            return self.read_slow(offset)
+        return RawDIE(
+            self, offset, abbrev.tag, abbrev.has_children, attrs, pos - offset
+        )
+
+    def read_slow(self, offset: int) -> RawDIE:
+        stream = self.dwarfinfo.debug_info_sec.stream
+        die = DIE(cu=self.cu, stream=stream, offset=offset)
+        attrs = {
+            name: RawAttribute(attr.form, attr.value, attr.raw_value)
+            for name, attr in die.attributes.items()
+            if name in WANTED_ATTRS
+        }
+        return RawDIE(self, offset, die.tag, die.has_children, attrs, die.size)
+
+    def iter_children(self, die: RawDIE) -> Iterator[RawDIE]:
+        if not die.has_children:
+            return
+
+        offset = die.offset + die.size
+        while True:
+            child = self.read(offset)
+            if child is None:
+                die.end = offset + 1
+                return
+            yield child
+            offset = self.get_end(child)
+
+    def get_end(self, die: RawDIE) -> int:
+        if die.end is not None:
+            return die.end
+
+        if not die.has_children:
+            die.end = die.offset + die.size
+        elif self.get_sibling(die.attributes) is not None:
+            die.end = self.get_sibling(die.attributes)
+        else:
+            die.end = self.skip_children(die.offset + die.size)
+        return die.end
+
+    def get_sibling(self, attrs: Dict[str, RawAttribute]) -> Optional[int]:
+        sibling = attrs.get("DW_AT_sibling")
+        if sibling is None or sibling.form not in LOCAL_REF_FORMS:
+            return None
+        return self.cu.cu_offset + sibling.raw_value
+
+    def skip_children(self, offset: int) -> int:
+        # Returns the offset past the null entry that ends this list of children
+        depth = 1
+        while depth:
+            abbrev, attrs, offset = self.parse(offset, decode=False)
+            if abbrev is None:
+                depth -= 1
+            elif abbrev.has_children:
+                sibling = self.get_sibling(attrs)
+                if sibling is not None:
+                    offset = sibling
+                else:
+                    depth += 1
+        return offset
+
+    def get_DIE_from_attribute(self, die: RawDIE, name: str):
+        attr = die.attributes[name]
+        if attr.form in LOCAL_REF_FORMS:
+            return self.get_cached(self.cu.cu_offset + attr.raw_value)
+        if attr.form == "DW_FORM_ref_addr":
+            offset = attr.raw_value
+            if self.start <= offset < self.end:
+                return self.get_cached(offset)
+            return self.get_other_reader(offset).get_cached(offset)
+        # Leave the remaining reference classes to pyelftools
+        stream = self.dwarfinfo.debug_info_sec.stream
+        elf_die = DIE(cu=self.cu, stream=stream, offset=die.offset)
+        return elf_die.get_DIE_from_attribute(name)
+
+    def get_other_reader(self, offset: int) -> "DIEReader":
+        for reader in self.other_readers.values():
+            if reader.start <= offset < reader.end:
+                return reader
+        cu = self.dwarfinfo.get_CU_containing(offset)
+        reader = DIEReader(cu, self.cache_size)
+        self.other_readers[cu.cu_offset] = reader
+        return reader
+
+    def get_cached(self, offset: int) -> RawDIE:
+        die = self.cache.get(offset)
+        if die is not None:
+            self.cache.move_to_end(offset)
+            return die
+
+        die = self.read(offset)
+        assert die is not None, f"Null DIE at {offset:#x}"
+        self.cache[offset] = die
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return die
+
+    def get_top_DIE(self) -> RawDIE:
+        return self.read(self.start)
@@ -1,4 +1,5 @@
 import dataclasses
+import logging
 from dataclasses import dataclass
 from enum import StrEnum
 from typing import List, Optional
@@ -57,3 +58,31 @@ class FuncEntry:
     @property
     def has_func_caller(self) -> bool:
         return bool(self.caller_func)
+
+    def merge(self, other: "FuncEntry"):
+        # Fold in an entry for the same function recorded from later CUs, as
+        # if the CUs had been traversed in order
+        assert self.name == other.name
+        assert self.external == other.external
+
+        if self.addr == 0:
+            self.addr = other.addr
+        if self.loc is None:
+            self.loc = other.loc
+        if self.file is None:
+            self.file = other.file
+
+        if self.inline in (InlineStatus.UNSEEN, InlineStatus.SEEN_UNKNOWN):
+            if other.inline != InlineStatus.UNSEEN:
+                self.inline = other.inline
+        elif other.inline not in (
+            InlineStatus.UNSEEN,
+            InlineStatus.SEEN_UNKNOWN,
+            self.inline,
+        ):
+            logging.warning(
+                f"Conflicting inline status for {self.name}: {self.inline} vs {other.inline}"
+            )
+
+        self.caller_inline.extend(other.caller_inline)
+        self.caller_func.extend(other.caller_func)
@@ -47,13 +47,10 @@ class FuncSymbol:
 
 def get_func_symbols(symtab: SymbolTable) -> Dict[str, List[FuncSymbol]]:
     result: Dict[str, List[FuncSymbol]] = defaultdict(list)
-    for sym in symtab.data:
-        if sym["type"] != "STT_FUNC":
-            continue
+    # Ref: https://github.com/torvalds/linux/commit/9f2899fe36a623885d8576604cb582328ad32b3c
+    mask = symtab.isin("type", ["STT_FUNC"]) & ~symtab.name_startswith("__pfx")
+    for sym in symtab.iter_rows(mask):
         name: str = sym["name"]
-        # Ref: https://github.com/torvalds/linux/commit/9f2899fe36a623885d8576604cb582328ad32b3c
-        if name.startswith("__pfx"):
-            continue
         if sym["visibility"] != "STV_DEFAULT":
             logging.debug(f"Symbol {name} is not default visibility: {sym}")
         func_sym = FuncSymbol(
@@ -1,21 +1,141 @@
+import bz2
+import gzip
 import logging
+import lzma
+import shutil
+import tarfile
+from contextlib import contextmanager
 from pathlib import Path
+from struct import Struct
+from typing import BinaryIO, Dict, Iterator, Tuple
 
+import zstandard
 from elftools.elf.elffile import ELFFile
 
-from depsurf.utils import manage_result_path, system
+from depsurf.utils import manage_result_path, manage_result_paths, system
+
+# Ref: https://man7.org/linux/man-pages/man5/deb.5.html
+AR_MAGIC = b"!<arch>\n"
+AR_HEADER = Struct("16s12s6s6s8s10s2s")
+
+
+def iter_ar_members(f: BinaryIO) -> Iterator[Tuple[str, int]]:
+    # Yields (name, size) with f positioned at the start of the member data
+    if f.read(len(AR_MAGIC)) != AR_MAGIC:
+        raise ValueError(f"Not an ar archive: {f.name}")
+
+    while True:
+        header = f.read(AR_HEADER.size)
+        if not header:
+            return
+        if len(header) != AR_HEADER.size:
+            raise ValueError(f"Truncated ar header in {f.name}")
+
+        name, _, _, _, _, size, fmag = AR_HEADER.unpack(header)
+        if fmag != b"`\n":
+            raise ValueError(f"Invalid ar header in {f.name}")
+        name = name.decode().strip().removesuffix("/")
+        size = int(size)
+
+        start = f.tell()
+        yield name, size
+        # Members are aligned to 2 bytes
+        f.seek(start + size + size % 2)
+
+
+class MemberReader:
+    def __init__(self, f: BinaryIO, size: int):
+        self.f = f
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+
+@contextmanager
+def open_zstd(reader: MemberReader):
+    dctx = zstandard.ZstdDecompressor()
+    with dctx.stream_reader(reader, read_across_frames=True) as f:
+        yield f
+
+
+@contextmanager
+def open_deb_data(deb_path: Path):
+    # Yields a stream of the decompressed data.tar of a .deb
+    with open(deb_path, "rb") as f:
+        for name, size in iter_ar_members(f):
+            if not name.startswith("data.tar"):
+                continue
+
+            reader = MemberReader(f, size)
+            suffix = name.removeprefix("data.tar")
+            if suffix == "":
+                yield reader
+            elif suffix in (".xz", ".lzma"):
+                with lzma.LZMAFile(reader) as data:
+                    yield data
+            elif suffix == ".gz":
+                with gzip.GzipFile(fileobj=reader) as data:
+                    yield data
+            elif suffix == ".bz2":
+                with bz2.BZ2File(reader) as data:
+                    yield data
+            elif suffix == ".zst":
+                with open_zstd(reader) as data:
+                    yield data
+            else:
+                raise ValueError(f"Unsupported {name} in {deb_path}")
+            return
+
+    raise ValueError(f"No data.tar in {deb_path}")
 
 
 def list_deb(deb_path: Path):
-    system(f"dpkg -c {deb_path}")
+    with open_deb_data(deb_path) as data, tarfile.open(fileobj=data, mode="r|") as tar:
+        tar.list()
+
+
+def extract_deb_impl(deb_path: Path, result_paths: Dict[str, Path]):
+    # Single pass over data.tar, stopping once every file has been found
+    remaining = {
+        file_path.lstrip("/"): result_path
+        for file_path, result_path in result_paths.items()
+    }
+
+    with open_deb_data(deb_path) as data, tarfile.open(fileobj=data, mode="r|") as tar:
+        for member in tar:
+            name = member.name.removeprefix("./")
+            result_path = remaining.pop(name, None)
+            if result_path is None:
+                continue
+            if not member.isfile():
+                raise ValueError(f"{member.name} in {deb_path} is not a regular file")
+
+            logging.info(f"Extracting {member.name} from {deb_path}")
+            with tar.extractfile(member) as src, open(result_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+
+            if not remaining:
+                return
+
+    raise FileNotFoundError(f"{list(remaining)} not found in {deb_path}")
 
 
 @manage_result_path
 def extract_deb(deb_path: Path, file_path: str, result_path: Path):
-    system(
-        f"dpkg --fsys-tarfile {deb_path} | tar -xO .{file_path} > {result_path}",
-        linux=True,
-    )
+    extract_deb_impl(deb_path, {file_path: result_path})
+
+
+@manage_result_paths
+def extract_deb_files(deb_path: Path, result_paths: Dict[str, Path]):
+    extract_deb_impl(deb_path, result_paths)
 
 
 @manage_result_path
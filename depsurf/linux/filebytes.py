@@ -1,9 +1,12 @@
 import logging
+import mmap
 import shutil
+from bisect import bisect_right
 from functools import cached_property
 from pathlib import Path
-from typing import Dict, Literal
+from typing import Dict, List, Literal, Tuple
 
+import numpy as np
 from elftools.elf.dynamic import DynamicSection
 from elftools.elf.elffile import ELFFile
 from elftools.elf.relocation import RelocationSection
@@ -46,33 +49,125 @@ class FileBytes:
             "little" if self.elf.little_endian else "big"
         )
 
+        # The whole image is mapped once; reads are slices of the mapping
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+        # PT_LOAD segments sorted by vaddr, as (vaddr, vaddr + filesz, offset)
+        self.segments: List[Tuple[int, int, int]] = sorted(
+            (seg["p_vaddr"], seg["p_vaddr"] + seg["p_filesz"], seg["p_offset"])
+            for seg in self.elf.iter_segments(type="PT_LOAD")
+        )
+        self.segment_starts = [start for start, _, _ in self.segments]
+
     def __del__(self):
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Slices handed out by get_bytes still reference the mapping
+            pass
         self.file.close()
 
-    def addr_to_offset(self, addr):
-        offsets = list(self.elf.address_offsets(addr))
-        if len(offsets) == 1:
-            return offsets[0]
-        elif len(offsets) == 0:
+    def get_segment(self, addr) -> Tuple[int, int, int]:
+        segments = []
+        i = bisect_right(self.segment_starts, addr) - 1
+        while i >= 0:
+            segment = self.segments[i]
+            if addr < segment[1]:
+                segments.append(segment)
+            i -= 1
+
+        if len(segments) == 1:
+            return segments[0]
+        elif len(segments) == 0:
             raise ValueError(f"Address {addr:x} not found")
         else:
             raise ValueError(f"Multiple offsets found for address {addr:x}")
 
-    def get_bytes(self, addr, size=8) -> bytes:
+    def addr_to_offset(self, addr):
+        start, _, offset = self.get_segment(addr)
+        return addr - start + offset
+
+    def get_bytes(self, addr, size=8) -> memoryview:
         if addr in self.relocations:
-            assert size == 8
-            return self.relocations[addr]
+            assert size == self.ptr_size
+            return memoryview(self.relocations[addr])
+        offset = self.addr_to_offset(addr)
+        return self.view[offset : offset + size]
+
+    def get_buffer(self, addr, size) -> bytes:
+        # Raw bytes of the range with the relocation overrides patched in,
+        # including those that only partly overlap it (e.g. 4-byte fields).
+        # Relocated values are pointer-sized.
         offset = self.addr_to_offset(addr)
-        self.stream.seek(offset)
-        return self.stream.read(size)
+        data = self.view[offset : offset + size]
+        reloc_addrs, _ = self.relocation_table
+        first = max(addr - self.ptr_size + 1, 0)
+        bounds = np.array([first, addr + size], dtype=np.uint64)
+        lo, hi = np.searchsorted(reloc_addrs, bounds)
+        if hi == lo:
+            return data
+
+        buf = bytearray(data)
+        for reloc_addr in reloc_addrs[lo:hi].tolist():
+            value = self.relocations[reloc_addr]
+            start = max(reloc_addr, addr)
+            end = min(reloc_addr + len(value), addr + size)
+            patch = value[start - reloc_addr : end - reloc_addr]
+            buf[start - addr : end - addr] = patch
+        return bytes(buf)
 
     def get_int(self, addr, size) -> int:
         b = self.get_bytes(addr, size)
         return int.from_bytes(b, self.byteorder)
 
+    def get_int_array(self, addr, count, size) -> np.ndarray:
+        # Reads `count` contiguous ints of `size` bytes as one buffer
+        if count == 0:
+            return np.zeros(0, dtype=np.uint64)
+
+        nbytes = count * size
+        start, end, offset = self.get_segment(addr)
+        offset += addr - start
+        if addr + nbytes > end:
+            # The range runs past the segment; fall back to per-element reads
+            return np.array(
+                [self.get_int(addr + i * size, size) for i in range(count)],
+                dtype=np.uint64,
+            )
+
+        dtype = np.dtype(f"{'<' if self.byteorder == 'little' else '>'}u{size}")
+        result = np.frombuffer(self.mmap, dtype, count, offset).astype(np.uint64)
+
+        # Apply relocation overrides that land on an element
+        reloc_addrs, reloc_vals = self.relocation_table
+        bounds = np.array([addr, addr + nbytes], dtype=np.uint64)
+        lo, hi = np.searchsorted(reloc_addrs, bounds)
+        if hi > lo:
+            assert size == self.ptr_size
+            delta = reloc_addrs[lo:hi] - np.uint64(addr)
+            aligned = delta % size == 0
+            result[delta[aligned] // size] = reloc_vals[lo:hi][aligned]
+
+        return result
+
+    def get_ptr_array(self, start, end) -> np.ndarray:
+        count = (end - start + self.ptr_size - 1) // self.ptr_size
+        return self.get_int_array(start, count, self.ptr_size)
+
     def get_cstr(self, addr, size=4096) -> str:
-        data = self.get_bytes(addr, size)
-        return get_cstr(data, 0)
+        offset = self.addr_to_offset(addr)
+        end = self.mmap.find(b"\x00", offset, offset + size)
+        if end < 0:
+            end = min(offset + size, len(self.mmap)) - 1
+        return self.mmap[offset:end].decode()
+
+    @cached_property
+    def relocation_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        addrs = sorted(self.relocations)
+        vals = [int.from_bytes(self.relocations[a], self.byteorder) for a in addrs]
+        return np.array(addrs, dtype=np.uint64), np.array(vals, dtype=np.uint64)
 
     @cached_property
     def relocations(self) -> Dict[int, bytes]:
@@ -117,6 +212,6 @@ class FileBytes:
             else:
                 raise ValueError(f"Unknown relocation type {r} for arch {arch}")
             addr = r["r_offset"]
-            result[addr] = val.to_bytes(8, self.byteorder)
+            result[addr] = val.to_bytes(self.ptr_size, self.byteorder)
 
         return result
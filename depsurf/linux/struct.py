@@ -1,55 +1,45 @@
+from typing import Dict, Optional, Tuple
+
 from depsurf.btf import Kind, Types
 
 from .filebytes import FileBytes
 
 
-class StructInstance:
+class StructLayout:
+    # Offsets and sizes of the int and pointer members of a struct, computed
+    # once so that instances can be decoded from a single read
     def __init__(
-        self,
-        struct_types: Types,
-        int_types: Types,
-        filebytes: FileBytes,
-        name: str,
-        ptr: int,
+        self, struct_types: Types, int_types: Types, ptr_size: int, name: str
     ):
-        self.int_types = int_types
-        self.filebytes = filebytes
-        self.name = name
-        self.ptr = ptr
-
         t = struct_types.get(name)
         assert t is not None, f"Could not find struct {name}"
 
+        self.name = name
         self.size = t["size"]
-        self.members = {m["name"]: m for m in t["members"]}
-
-    def get_offset(self, member_name):
-        bits_offset = self.members[member_name]["bits_offset"]
-        assert bits_offset % 8 == 0
-        return bits_offset // 8
-
-    def get(self, name, size=None) -> int:
-        m = self.members[name]
-        t = m["type"]
-        kind = t["kind"]
-
-        addr = self.ptr + self.get_offset(name)
-
-        if size is None:
-            if kind == Kind.PTR:
-                size = self.filebytes.ptr_size
+        self.fields: Dict[str, Optional[Tuple[int, int]]] = {}
+
+        for m in t["members"]:
+            kind = m["type"]["kind"]
+            if m["bits_offset"] % 8 != 0:
+                field = None
+            elif kind == Kind.PTR:
+                field = (m["bits_offset"] // 8, ptr_size)
             elif kind == Kind.INT:
-                size = self.int_types[t["name"]]["size"]
+                field = (m["bits_offset"] // 8, int_types[m["type"]["name"]]["size"])
             else:
-                raise NotImplementedError
-
-        return self.filebytes.get_int(addr, size)
+                field = None
+            self.fields[m["name"]] = field
 
-    def __getitem__(self, name) -> int:
-        return self.get(name)
+    def decode(self, data: bytes, byteorder) -> Dict[str, int]:
+        return {
+            name: int.from_bytes(data[field[0] : field[0] + field[1]], byteorder)
+            for name, field in self.fields.items()
+            if field is not None
+        }
 
-    def get_bytes(self):
-        return self.filebytes.get_bytes(self.ptr, self.size)
+    def read(self, filebytes: FileBytes, ptr: int) -> Dict[str, int]:
+        data = filebytes.get_buffer(ptr, self.size)
+        return self.decode(data, filebytes.byteorder)
 
     def __repr__(self):
-        return f"StructInstance({self.name}, {self.ptr:x}): {self.get_bytes().hex()}"
+        return f"StructLayout({self.name}, {self.size} bytes)"
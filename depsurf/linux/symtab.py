@@ -1,8 +1,10 @@
 import json
 import logging
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from elftools.elf.elffile import ELFFile
 from elftools.elf.sections import SymbolTableSection
 
@@ -41,26 +43,155 @@ def dump_symtab(vmlinux_path: Path, result_path: Path):
 
 
 class SymbolTable:
-    def __init__(self, data: List[Dict]):
-        self.data: List[Dict] = data
+    # Columnar layout: one array per field. String fields other than the name
+    # (section, bind, type, visibility) are stored as small-int codes into
+    # `categories`; names share a single variable-width string array.
+    def __init__(
+        self,
+        keys: List[str],
+        columns: Dict[str, np.ndarray],
+        categories: Dict[str, List[str]],
+    ):
+        self.keys = keys
+        self.columns = columns
+        self.categories = categories
+
+    @classmethod
+    def from_dicts(cls, data: Iterable[Dict]):
+        keys: List[str] = []
+        values: Dict[str, List] = {}
+        codes: Dict[str, Dict[str, int]] = {}
+
+        for sym in data:
+            if not keys:
+                keys = list(sym.keys())
+                values = {k: [] for k in keys}
+                assert "name" in keys and "value" in keys and "size" in keys
+            for k in keys:
+                v = sym[k]
+                if k != "name" and isinstance(v, str):
+                    v = codes.setdefault(k, {}).setdefault(v, len(codes[k]))
+                values[k].append(v)
+
+        if not keys:
+            keys = ["name", "value", "size"]
+            values = {k: [] for k in keys}
+
+        columns = {}
+        for k in keys:
+            if k == "name":
+                columns[k] = np.array(values[k], dtype=np.dtypes.StringDType())
+            elif k in codes:
+                columns[k] = np.array(values[k], dtype=np.uint16)
+            else:
+                columns[k] = np.array(values[k], dtype=np.uint64)
+
+        categories = {k: list(c.keys()) for k, c in codes.items()}
+        return cls(keys, columns, categories)
 
     @classmethod
     def from_dump(cls, path):
-        data = []
         logging.info(f"Loading symtab from {path}")
         with open(path) as f:
-            for line in f:
-                data.append(json.loads(line))
-        return cls(data)
+            return cls.from_dicts(json.loads(line) for line in f)
+
+    @property
+    def names(self) -> np.ndarray:
+        return self.columns["name"]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.columns["value"]
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return self.columns["size"]
+
+    def get_row(self, i: int) -> Dict:
+        row = {}
+        for k in self.keys:
+            v = self.columns[k][i]
+            if k == "name":
+                row[k] = str(v)
+            elif k in self.categories:
+                row[k] = self.categories[k][v]
+            else:
+                row[k] = int(v)
+        return row
+
+    def iter_rows(self, mask: Optional[np.ndarray] = None) -> Iterator[Dict]:
+        indices = range(len(self)) if mask is None else np.flatnonzero(mask)
+        for i in indices:
+            yield self.get_row(i)
+
+    @cached_property
+    def data(self) -> List[Dict]:
+        # Row view for callers that still expect a list of dicts
+        return list(self.iter_rows())
+
+    # Vectorized filters, combinable with & | ~
+    def isin(self, key: str, values: Iterable[str]) -> np.ndarray:
+        if key not in self.columns:
+            # e.g. a table loaded from an empty dump
+            return np.zeros(len(self), dtype=bool)
+        lookup = {v: i for i, v in enumerate(self.categories.get(key, []))}
+        codes = [lookup[v] for v in values if v in lookup]
+        return np.isin(self.columns[key], codes)
+
+    def name_startswith(self, prefix: str) -> np.ndarray:
+        return np.strings.startswith(self.names, prefix)
+
+    def name_contains(self, sub: str) -> np.ndarray:
+        return np.strings.find(self.names, sub) >= 0
+
+    @cached_property
+    def name_index(self) -> Dict[str, List[int]]:
+        index: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.names.tolist()):
+            index.setdefault(name, []).append(i)
+        return index
+
+    @cached_property
+    def addr_index(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Row indices sorted by address, their addresses, and the running max
+        # of their end addresses to bound the backward scan in
+        # get_symbols_containing
+        order = np.argsort(self.values, kind="stable")
+        addrs = self.values[order]
+        max_ends = np.maximum.accumulate(addrs + self.sizes[order])
+        return order, addrs, max_ends
+
+    def get_symbols_by_name(self, name: str) -> List[Dict]:
+        return [self.get_row(i) for i in self.name_index.get(name, [])]
+
+    def get_symbols_by_addr(self, addr: int) -> List[Dict]:
+        order, addrs, _ = self.addr_index
+        lo = np.searchsorted(addrs, np.uint64(addr), side="left")
+        hi = np.searchsorted(addrs, np.uint64(addr), side="right")
+        return [self.get_row(i) for i in order[lo:hi]]
+
+    def get_symbols_containing(self, addr: int) -> List[Dict]:
+        order, addrs, max_ends = self.addr_index
+        result = []
+        i = int(np.searchsorted(addrs, np.uint64(addr), side="right")) - 1
+        while i >= 0 and max_ends[i] > addr:
+            row = order[i]
+            if self.values[row] + self.sizes[row] > addr:
+                result.append(self.get_row(row))
+            i -= 1
+        return result
 
-    def get_symbols_by_name(self, name: str):
-        return [sym for sym in self.data if sym["name"] == name]
+    def get_func_containing(self, addr: int) -> Optional[Dict]:
+        for sym in self.get_symbols_containing(addr):
+            if sym["type"] == "STT_FUNC":
+                return sym
+        return None
 
-    def get_symbols_by_addr(self, addr: int):
-        return [sym for sym in self.data if sym["value"] == addr]
+    def __len__(self) -> int:
+        return len(self.names)
 
     def __repr__(self):
-        return f"SymbolTable({len(self.data)} symbols)"
+        return f"SymbolTable({len(self)} symbols)"
 
     def __iter__(self):
-        return iter(self.data)
+        return self.iter_rows()
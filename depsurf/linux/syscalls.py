@@ -2,6 +2,8 @@ import json
 import logging
 from typing import Iterable, Tuple, TYPE_CHECKING
 
+import numpy as np
+
 from depsurf.utils import manage_result_path
 
 from .filebytes import FileBytes
@@ -22,38 +24,34 @@ class SyscallExtracter:
         self.table_size = None
         self.addr_to_name = {}
 
-        for sym in self.symtab.data:
-            if sym["name"] == "sys_call_table":
-                assert self.table_addr is None
-                assert self.table_size is None
-                self.table_addr = sym["value"]
-                self.table_size = sym["size"]
-                if self.table_size == 0:
-                    logging.warning("sys_call_table size is 0. Using hardcoded size")
-                    # https://github.com/torvalds/linux/blob/219d54332a09e8d8741c1e1982f5eae56099de85/include/uapi/asm-generic/unistd.h#L855
-                    self.table_size = 436 * self.filebytes.ptr_size
+        table_syms = self.symtab.get_symbols_by_name("sys_call_table")
+        assert len(table_syms) <= 1
+        for sym in table_syms:
+            self.table_addr = sym["value"]
+            self.table_size = sym["size"]
+            if self.table_size == 0:
+                logging.warning("sys_call_table size is 0. Using hardcoded size")
+                # https://github.com/torvalds/linux/blob/219d54332a09e8d8741c1e1982f5eae56099de85/include/uapi/asm-generic/unistd.h#L855
+                self.table_size = 436 * self.filebytes.ptr_size
 
-            if (
-                sym["type"] in ("STT_FUNC", "STT_NOTYPE")
-                and any(p in sym["name"] for p in SYSCALL_PREFIXES)
-                and (
-                    sym["value"] not in self.addr_to_name or sym["bind"] == "STB_GLOBAL"
-                )
-            ):
+        mask = self.symtab.isin("type", ["STT_FUNC", "STT_NOTYPE"])
+        mask &= np.logical_or.reduce(
+            [self.symtab.name_contains(p) for p in SYSCALL_PREFIXES]
+        )
+        for sym in self.symtab.iter_rows(mask):
+            if sym["value"] not in self.addr_to_name or sym["bind"] == "STB_GLOBAL":
                 self.addr_to_name[sym["value"]] = sym["name"]
 
     def iter_syscall(self) -> Iterable[Tuple[str, int]]:
         assert self.table_addr is not None
         assert self.table_size is not None
 
-        for i, ptr in enumerate(
-            range(
-                self.table_addr,
-                self.table_addr + self.table_size,
-                self.filebytes.ptr_size,
-            )
-        ):
-            val = self.filebytes.get_int(ptr, self.filebytes.ptr_size)
+        ptr_size = self.filebytes.ptr_size
+        vals = self.filebytes.get_ptr_array(
+            self.table_addr, self.table_addr + self.table_size
+        )
+        for i, val in enumerate(vals.tolist()):
+            ptr = self.table_addr + i * ptr_size
             name = self.addr_to_name.get(val)
             if name is None:
                 logging.warning(f"Unknown syscall at {i}: {ptr:x} -> {val:x}")
@@ -7,7 +7,6 @@ from typing import TYPE_CHECKING, Dict, Iterator, Optional
 
 from depsurf.utils import manage_result_path
 
-from .struct import StructInstance
 
 if TYPE_CHECKING:
     from depsurf.linux_image import LinuxImage
@@ -32,23 +31,26 @@ class TracepointsExtractor:
 
         self.filebytes = img.filebytes
         self.symtab = img.symtab
+        self.event_layout = img.get_struct_layout("trace_event_call")
+
+        # Ref: https://github.com/torvalds/linux/blob/49668688dd5a5f46c72f965835388ed16c596055/kernel/module.c#L2317
+        for sym in self.symtab.get_symbols_by_name("__start_ftrace_events"):
+            if sym["type"] == "STT_NOTYPE":
+                self.start_ftrace_events = sym["value"]
+        for sym in self.symtab.get_symbols_by_name("__stop_ftrace_events"):
+            if sym["type"] == "STT_NOTYPE":
+                self.stop_ftrace_events = sym["value"]
 
         self.event_names = {}
         self.class_names = {}
-        for sym in self.symtab:
-            t = sym["type"]
+        mask = self.symtab.isin("type", ["STT_OBJECT"])
+        mask &= self.symtab.name_startswith("event_")
+        for sym in self.symtab.iter_rows(mask):
             name: str = sym["name"]
-            if t == "STT_NOTYPE":
-                # Ref: https://github.com/torvalds/linux/blob/49668688dd5a5f46c72f965835388ed16c596055/kernel/module.c#L2317
-                if name == "__start_ftrace_events":
-                    self.start_ftrace_events = sym["value"]
-                elif name == "__stop_ftrace_events":
-                    self.stop_ftrace_events = sym["value"]
-            elif t == "STT_OBJECT":
-                if name.startswith("event_class_"):
-                    self.class_names[sym["value"]] = name.removeprefix("event_class_")
-                elif name.startswith("event_"):
-                    self.event_names[sym["value"]] = name.removeprefix("event_")
+            if name.startswith("event_class_"):
+                self.class_names[sym["value"]] = name.removeprefix("event_class_")
+            else:
+                self.event_names[sym["value"]] = name.removeprefix("event_")
 
         for e in img.enum_types["(anon)"]["values"]:
             if e["name"] == "TRACE_EVENT_FL_TRACEPOINT":
@@ -58,8 +60,11 @@ class TracepointsExtractor:
 
     def iter_event_ptrs(self) -> Iterator[int]:
         ptr_size = self.filebytes.ptr_size
-        for ptr in range(self.start_ftrace_events, self.stop_ftrace_events, ptr_size):
-            event_ptr = self.filebytes.get_int(ptr, ptr_size)
+        event_ptrs = self.filebytes.get_ptr_array(
+            self.start_ftrace_events, self.stop_ftrace_events
+        )
+        for i, event_ptr in enumerate(event_ptrs.tolist()):
+            ptr = self.start_ftrace_events + i * ptr_size
             if event_ptr == 0:
                 logging.warning(f"Invalid event pointer: {ptr:x} -> {event_ptr:x}")
                 continue
@@ -67,13 +72,7 @@ class TracepointsExtractor:
 
     def get_tracepoint(self, ptr: int) -> Optional[Tracepoint]:
         # Ref: https://github.com/torvalds/linux/blob/2425bcb9240f8c97d793cb31c8e8d8d0a843fa29/include/linux/trace_events.h#L272
-        event = StructInstance(
-            struct_types=self.struct_types,
-            int_types=self.int_types,
-            filebytes=self.filebytes,
-            name="trace_event_call",
-            ptr=ptr,
-        )
+        event = self.event_layout.read(self.filebytes, ptr)
         class_name = self.class_names[event["class"]]
         flags = event["flags"]
 
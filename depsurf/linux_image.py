@@ -1,11 +1,20 @@
 import json
+import logging
 from functools import cached_property
-from typing import Dict, Optional
+from typing import Dict, Mapping, Optional
 
 from depsurf.btf import Types
 from depsurf.dep import Dep, DepKind, DepStatus
-from depsurf.funcs import FuncGroups
-from depsurf.linux import FileBytes, SymbolTable, Tracepoints, get_configs
+from depsurf.funcs import FuncGroup, FuncGroups
+from depsurf.linux import (
+    FileBytes,
+    StructLayout,
+    SymbolTable,
+    Tracepoints,
+    get_configs,
+)
+from depsurf.pack import PACK_SOURCES, VersionPack
+from depsurf.type_store import TypeMap, load_type_map
 from depsurf.version import Version
 
 
@@ -56,6 +65,19 @@ class LinuxImage:
             return self.kfuncs
         raise ValueError(f"Unknown DepKind: {kind}")
 
+    def get_fingerprints_by_kind(self, kind: DepKind) -> Optional[Mapping[str, str]]:
+        if kind in (DepKind.FUNC, DepKind.KFUNC):
+            return self.func_types.fingerprints
+        elif kind == DepKind.STRUCT:
+            return self.struct_types.fingerprints
+        elif kind == DepKind.UNION:
+            return self.union_types.fingerprints
+        elif kind == DepKind.ENUM:
+            return self.enum_types.fingerprints
+        elif kind == DepKind.TRACEPOINT:
+            return getattr(self.tracepoints.data, "fingerprints", None)
+        return None
+
     def get_dep(self, dep: Dep) -> Optional[Dict]:
         if dep.kind == DepKind.FIELD:
             struct_name, field_name = dep.name.split("::")
@@ -90,42 +112,107 @@ class LinuxImage:
     def filebytes(self):
         return FileBytes(self.version.vmlinux_path)
 
+    @cached_property
+    def struct_layouts(self) -> Dict[str, StructLayout]:
+        return {}
+
+    def get_struct_layout(self, name: str) -> StructLayout:
+        layout = self.struct_layouts.get(name)
+        if layout is None:
+            layout = StructLayout(
+                struct_types=self.struct_types,
+                int_types=self.int_types,
+                ptr_size=self.filebytes.ptr_size,
+                name=name,
+            )
+            self.struct_layouts[name] = layout
+        return layout
+
+    @cached_property
+    def pack(self) -> Optional[VersionPack]:
+        # Packed container from `dump_pack`, used in place of individual files
+        path = self.version.pack_path
+        if not path.exists():
+            return None
+        try:
+            return VersionPack(path)
+        except ValueError as e:
+            # e.g. written by an older version of `dump_pack`; rebuild it
+            logging.warning(f"Ignoring {path}: {e}")
+            return None
+
+    def has_packed(self, name: str) -> bool:
+        # Stale sections fall back to the files they were packed from
+        if self.pack is None or name not in self.pack:
+            return False
+        return self.pack.is_current(name, getattr(self.version, PACK_SOURCES[name]))
+
+    @cached_property
+    def type_map(self) -> Optional[TypeMap]:
+        # Names -> fingerprints in the shared store, from `dump_type_map`
+        return load_type_map(self.version.type_map_path)
+
+    def has_stored(self, name: str, path) -> bool:
+        # Like packs, stale sections fall back to the dumps
+        if self.type_map is None or name not in self.type_map:
+            return False
+        return self.type_map.is_current(name, path)
+
+    def load_types(self, name: str, path) -> Types:
+        if self.has_stored(name, path):
+            return Types(self.type_map.get_types(name))
+        if self.has_packed(name):
+            return Types(self.pack.get_section(name))
+        return Types.from_dump(path, lazy=True)
+
     @cached_property
     def syscalls(self) -> Dict[str, int]:
+        if self.has_packed("syscalls"):
+            syscalls = self.pack.get_blob("syscalls")
+            return {v: 0 for v in syscalls.values()}
         with open(self.version.syscalls_path) as f:
             syscalls = json.load(f)
             return {v: 0 for v in syscalls.values()}
 
     @cached_property
     def func_groups(self) -> FuncGroups:
+        if self.has_packed("func_groups"):
+            section = self.pack.get_section("func_groups")
+            return FuncGroups(
+                data={name: FuncGroup.from_dict(d) for name, d in section.items()}
+            )
         return FuncGroups.from_dump(self.version.func_groups_path)
 
     @cached_property
     def func_types(self) -> Types:
-        return Types.from_dump(self.version.func_types_path)
+        return self.load_types("types_func", self.version.func_types_path)
 
     @cached_property
     def struct_types(self) -> Types:
-        return Types.from_dump(self.version.struct_types_path)
+        return self.load_types("types_struct", self.version.struct_types_path)
 
     @cached_property
     def union_types(self) -> Types:
-        return Types.from_dump(self.version.union_types_path)
+        return self.load_types("types_union", self.version.union_types_path)
 
     @cached_property
     def enum_types(self) -> Types:
-        return Types.from_dump(self.version.enum_types_path)
+        return self.load_types("types_enum", self.version.enum_types_path)
 
     @cached_property
     def int_types(self) -> Types:
-        return Types.from_dump(self.version.int_types_path)
+        return self.load_types("types_int", self.version.int_types_path)
 
     @cached_property
     def symtab(self) -> SymbolTable:
+        if self.has_packed("symtab"):
+            return SymbolTable.from_dicts(self.pack.get_blob("symtab"))
         return SymbolTable.from_dump(self.version.symtab_path)
 
     @cached_property
     def tracepoints(self) -> Tracepoints:
+        if self.has_packed("tracepoints"):
+            return Tracepoints(data=self.pack.get_section("tracepoints"))
         return Tracepoints.from_dump(self.version.tracepoints_path)
 
     @cached_property
@@ -135,28 +222,32 @@ class LinuxImage:
             for e in self.struct_types["security_hook_heads"]["members"]
         }
         return {
-            k.removeprefix("security_"): v
-            for k, v in self.func_types.items()
+            k.removeprefix("security_"): self.func_types[k]
+            for k in self.func_types
             if k in func_names
         }
 
     @cached_property
     def kfuncs(self):
         prefix = "__BTF_ID__func__"
-        func_names = [
-            sym["name"].removeprefix(prefix).rsplit("__", 1)[0]
-            for sym in self.symtab.data
-            if sym["name"].startswith(prefix)
-            if "bpf_lsm_" not in sym["name"]
-        ]
-        return {k: v for k, v in self.func_types.items() if k in func_names}
+        symtab = self.symtab
+        mask = symtab.name_startswith(prefix) & ~symtab.name_contains("bpf_lsm_")
+        func_names = {
+            name.removeprefix(prefix).rsplit("__", 1)[0]
+            for name in symtab.names[mask].tolist()
+        }
+        return {k: self.func_types[k] for k in self.func_types if k in func_names}
 
     @cached_property
     def configs(self):
+        if self.has_packed("config"):
+            return self.pack.get_blob("config")
         return get_configs(self.version.config_path)
 
     @cached_property
     def comment(self):
+        if self.has_packed("comment"):
+            return self.pack.get_blob("comment").split("\n", 1)[0].strip()
         with open(self.version.comment_path) as f:
             return f.readline().strip()
 
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import pickle
+import struct
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from depsurf.btf import get_fingerprint
+from depsurf.linux import get_configs
+from depsurf.utils import InputRecord, is_source_current, manage_result_path
+from depsurf.version import Version
+
+# Layout: header | pickled records ... | pickled index
+# The index maps each section to {name: (offset, length)} of its records, and
+# each blob to the (offset, length) of a single pickled object. Sections also
+# have the fingerprint of each record, see `get_fingerprint`, and both record
+# the InputRecord of the file they were packed from.
+PACK_MAGIC = b"DSPK"
+PACK_VERSION = 2
+PACK_HEADER = struct.Struct("<4sIQQ")
+
+PACK_SECTIONS = {
+    "types_func": "func_types_path",
+    "types_struct": "struct_types_path",
+    "types_union": "union_types_path",
+    "types_enum": "enum_types_path",
+    "types_int": "int_types_path",
+    "tracepoints": "tracepoints_path",
+    "func_groups": "func_groups_path",
+}
+PACK_SECTION_KEYS = {
+    "tracepoints": "event_name",
+}
+PACK_BLOBS = {
+    "symtab": "symtab_path",
+    "syscalls": "syscalls_path",
+    "config": "config_path",
+    "comment": "comment_path",
+}
+PACK_SOURCES = {**PACK_SECTIONS, **PACK_BLOBS}
+
+
+class PackedSection(Mapping):
+    def __init__(
+        self,
+        pack: "VersionPack",
+        offsets: Dict[str, Tuple[int, int]],
+        fingerprints: Optional[Dict[str, str]] = None,
+    ):
+        self.pack = pack
+        self.offsets = offsets
+        self.fingerprints = fingerprints
+        self.decoded: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str):
+        t = self.decoded.get(name)
+        if t is not None:
+            return t
+
+        t = self.pack.load(*self.offsets[name])
+        self.decoded[name] = t
+        return t
+
+    def __contains__(self, name) -> bool:
+        return name in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+class VersionPack:
+    def __init__(self, path: Path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+        magic, version, index_offset, index_length = PACK_HEADER.unpack(
+            os.pread(self.fd, PACK_HEADER.size, 0)
+        )
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"Unsupported pack {path}: {magic} v{version}")
+
+        self.index = self.load(index_offset, index_length)
+        self.current: Dict[str, bool] = {}
+
+    def __del__(self):
+        os.close(self.fd)
+
+    def load(self, offset: int, length: int):
+        return pickle.loads(os.pread(self.fd, length, offset))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index["sections"] or name in self.index["blobs"]
+
+    def is_current(self, name: str, path: Path) -> bool:
+        # Whether `name` was packed from the file now at `path`
+        if name not in self.current:
+            record = self.index.get("sources", {}).get(name)
+            current = is_source_current(record, path)
+            if not current:
+                logging.warning(f"Ignoring {name} in {self}: {path} changed")
+            self.current[name] = current
+        return self.current[name]
+
+    def get_section(self, name: str) -> PackedSection:
+        # Packs written before fingerprints were added have none
+        fingerprints = self.index.get("fingerprints", {}).get(name)
+        return PackedSection(self, self.index["sections"][name], fingerprints)
+
+    def get_blob(self, name: str):
+        return self.load(*self.index["blobs"][name])
+
+    def __repr__(self):
+        return f"VersionPack({self.path})"
+
+
+def read_blob(name: str, path: Path):
+    if name == "symtab":
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+    if name == "syscalls":
+        with open(path) as f:
+            return json.load(f)
+    if name == "config":
+        return get_configs(path)
+    with open(path) as f:
+        return f.read()
+
+
+@manage_result_path
+def dump_pack(v: Version, result_path: Path):
+    index: Dict[str, Dict] = {
+        "sections": {},
+        "blobs": {},
+        "fingerprints": {},
+        "sources": {},
+    }
+
+    with open(result_path, "wb") as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, 0))
+
+        def write(obj) -> Tuple[int, int]:
+            data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            offset = f.tell()
+            f.write(data)
+            return offset, len(data)
+
+        for section, attr in PACK_SECTIONS.items():
+            path: Path = getattr(v, attr)
+            if not path.exists():
+                logging.warning(f"Skipping {section} for {v}: {path} not found")
+                continue
+            index["sources"][section] = vars(InputRecord.from_path(path))
+            key = PACK_SECTION_KEYS.get(section, "name")
+            offsets = {}
+            fingerprints = {}
+            with open(path, "rb") as fin:
+                for line in fin:
+                    record = json.loads(line)
+                    offsets[record[key]] = write(record)
+                    fingerprints[record[key]] = get_fingerprint(line)
+            index["sections"][section] = offsets
+            index["fingerprints"][section] = fingerprints
+
+        for blob, attr in PACK_BLOBS.items():
+            path: Path = getattr(v, attr)
+            if not path.exists():
+                logging.warning(f"Skipping {blob} for {v}: {path} not found")
+                continue
+            index["sources"][blob] = vars(InputRecord.from_path(path))
+            index["blobs"][blob] = write(read_blob(blob, path))
+
+        index_offset, index_length = write(index)
+        f.seek(0)
+        f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, index_offset, index_length))
@@ -0,0 +1,113 @@
+import logging
+import multiprocessing as mp
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from depsurf.dep import DepKind
+from depsurf.diff_cache import DIFF_CACHE_PATH, DiffCache
+from depsurf.linux_image import LinuxImage
+from depsurf.version_group import DiffGroupResult, DiffResult, VersionGroup
+from depsurf.version_pair import DiffKindResult, DiffPairResult, VersionPair
+
+DiffItem = Tuple[VersionPair, DepKind]
+
+
+# Splits the (pair, kind) items, sorted by pair, into one contiguous run per
+# worker. Consecutive pairs share a version (e.g. (N-1, N) and (N, N+1)), so a
+# worker loads each image of its run once.
+def plan_diff_chunks(items: List[DiffItem], num_chunks: int) -> List[List[DiffItem]]:
+    num_chunks = min(num_chunks, len(items))
+    if num_chunks == 0:
+        return []
+    size, extra = divmod(len(items), num_chunks)
+
+    chunks = []
+    start = 0
+    for i in range(num_chunks):
+        end = start + size + (i < extra)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def diff_chunk(chunk: List[DiffItem]) -> List[Tuple[DiffItem, DiffKindResult]]:
+    results = []
+    for i, (pair, kind) in enumerate(chunk):
+        logging.info(f"Diffing {kind} in {pair}")
+        results.append(((pair, kind), pair.diff_kind(kind)))
+
+        # Drop images that the rest of the chunk no longer needs
+        needed = {v for p, _ in chunk[i + 1 :] for v in (p.v1, p.v2)}
+        for v in (pair.v1, pair.v2):
+            if v not in needed:
+                LinuxImage.cache.pop(v, None)
+                v.__dict__.pop("img", None)
+    return results
+
+
+def diff_pairs(
+    pairs: List[VersionPair],
+    kinds: List[DepKind],
+    num_workers: Optional[int] = None,
+    cache_path: Optional[Path] = DIFF_CACHE_PATH,
+) -> Dict[VersionPair, DiffPairResult]:
+    num_workers = num_workers or mp.cpu_count()
+    cache = None if cache_path is None else DiffCache(cache_path)
+
+    # Only the items whose inputs changed since they were cached are diffed
+    kind_results: Dict[VersionPair, Dict[DepKind, DiffKindResult]] = {}
+    items: List[DiffItem] = []
+    for pair in sorted(set(pairs)):
+        for kind in kinds:
+            result = None if cache is None else cache.load(pair, kind)
+            if result is None:
+                items.append((pair, kind))
+            else:
+                kind_results.setdefault(pair, {})[kind] = result
+    num_cached = sum(len(results) for results in kind_results.values())
+    logging.info(f"Diffing {len(items)} (pair, kind) items, {num_cached} cached")
+
+    chunks = plan_diff_chunks(items, num_workers)
+    if len(chunks) <= 1:
+        chunk_results = [diff_chunk(chunk) for chunk in chunks]
+    else:
+        with mp.get_context("fork").Pool(len(chunks)) as pool:
+            chunk_results = pool.map(diff_chunk, chunks)
+
+    for results in chunk_results:
+        for (pair, kind), result in results:
+            kind_results.setdefault(pair, {})[kind] = result
+            if cache is not None:
+                cache.save(pair, kind, result)
+    if cache is not None:
+        cache.dump_digests()
+
+    # Same order of pairs and kinds as VersionPair.diff
+    return {
+        pair: DiffPairResult(
+            pair.v1, pair.v2, {kind: kind_results[pair][kind] for kind in kinds}
+        )
+        for pair in pairs
+    }
+
+
+def diff_groups(
+    groups: List[VersionGroup],
+    kinds: List[DepKind],
+    num_workers: Optional[int] = None,
+    cache_path: Optional[Path] = DIFF_CACHE_PATH,
+) -> DiffResult:
+    # All pairs go into one pool, so that small groups do not leave cores idle
+    pair_results = diff_pairs(
+        [pair for group in groups for pair in group.pairs],
+        kinds,
+        num_workers,
+        cache_path,
+    )
+    results: DiffResult = {}
+    for group in groups:
+        group_result: DiffGroupResult = {
+            pair: pair_results[pair] for pair in group.pairs
+        }
+        results[group] = group_result
+    return results
@@ -1,7 +1,11 @@
+import multiprocessing as mp
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
 from depsurf.btf import (
     Kind,
     dump_btf_header,
-    dump_btf_json,
     dump_btf_txt,
     dump_types,
 )
@@ -12,107 +16,314 @@ from depsurf.linux import (
     dump_syscalls,
     dump_tracepoints,
     extract_btf,
-    extract_deb,
+    extract_deb_files,
 )
 from depsurf.linux_image import LinuxImage
+from depsurf.paths import DATASET_PATH
+from depsurf.type_store import (
+    TYPE_STORE_SECTIONS,
+    dump_type_map,
+    has_dropped_type_dumps,
+)
+from depsurf.utils import MemoryEstimates, Task, run_stage, run_tasks
 from depsurf.version import Version
 
+# Bump a stage's version when its code changes to recompute its outputs (and,
+# through their digests, those of the stages that depend on them)
+STAGE_VERSIONS = {
+    "extract_vmlinux": 1,
+    "extract_vmlinuz": 1,
+    "extract_config": 1,
+    "extract_btf": 1,
+    "dump_btf_txt": 1,
+    "dump_btf_header": 1,
+    "dump_types": 1,
+    "dump_type_map": 1,
+    "dump_symtab": 1,
+    "dump_func_entries": 1,
+    "dump_func_groups": 1,
+    "dump_tracepoints": 1,
+    "dump_syscalls": 1,
+    "dump_comment": 1,
+}
 
-def prep(v: Version):
-    LinuxImage.disable_cache()
+# Stages that need several GB each; all others are "light"
+STAGE_RESOURCES = {
+    "dump_types": "heavy",
+    "dump_func_entries": "heavy",
+}
+
+# Peak RSS assumed for a stage until it has been measured
+STAGE_MEMORY_DEFAULTS = {
+    "dump_types": 8 << 30,
+    "dump_func_entries": 16 << 30,
+}
+STAGE_MEMORY_DEFAULT = 2 << 30
+STAGE_MEMORY_PATH = DATASET_PATH / "prep_memory.json"
+
+
+@dataclass
+class PrepStage:
+    name: str
+    fn: Callable
+    kwargs: Dict[str, Any]
+
+    @property
+    def resource(self) -> str:
+        return STAGE_RESOURCES.get(self.name, "light")
+
+    @property
+    def inputs(self) -> List[Path]:
+        paths = [
+            value
+            for name, value in self.kwargs.items()
+            if isinstance(value, Path) and name != "result_path"
+        ]
+        return paths + list(self.kwargs.get("deps", {}).values())
+
+    @property
+    def outputs(self) -> List[Path]:
+        if "result_paths" in self.kwargs:
+            return list(self.kwargs["result_paths"].values())
+        return [self.kwargs["result_path"]]
+
+    def run(self) -> bool:
+        return run_stage(self.name, STAGE_VERSIONS[self.name], self.fn, **self.kwargs)
+
+
+# A stage depends on the stages producing its inputs
+def get_stage_deps(stages: List[PrepStage]) -> Dict[str, List[str]]:
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {
+        stage.name: list(
+            dict.fromkeys(producers[p] for p in stage.inputs if p in producers)
+        )
+        for stage in stages
+    }
+
+
+def get_prep_stages(v: Version) -> List[PrepStage]:
+    stages: List[PrepStage] = []
+
+    def stage(name: str, fn, **kwargs):
+        stages.append(PrepStage(name, fn, kwargs))
 
     # Extract the Linux image with debug info
-    extract_deb(
+    stage(
+        "extract_vmlinux",
+        extract_deb_files,
         deb_path=v.dbgsym_download_path,
-        file_path=f"/usr/lib/debug/boot/vmlinux-{v.short_name}",
-        result_path=v.vmlinux_path,
+        result_paths={
+            f"/usr/lib/debug/boot/vmlinux-{v.short_name}": v.vmlinux_path,
+        },
     )
 
+    # Files from the image package, extracted in a single pass over it
+    image_files: Dict[str, Path] = {}
+
     # Extract the boot image
     if v.image_download_path.exists():
-        extract_deb(
-            deb_path=v.image_download_path,
-            file_path=(
-                f"/boot/vmlinux-{v.short_name}"
-                if v.arch == "ppc64el"
-                else f"/boot/vmlinuz-{v.short_name}"
-            ),
-            result_path=v.vmlinuz_path,
-        )
+        vmlinuz_name = "vmlinux" if v.arch == "ppc64el" else "vmlinuz"
+        image_files[f"/boot/{vmlinuz_name}-{v.short_name}"] = v.vmlinuz_path
 
     # Extract the config file
     if v.buildinfo_download_path.exists():  # from buildinfo
-        extract_deb(
+        stage(
+            "extract_config",
+            extract_deb_files,
             deb_path=v.buildinfo_download_path,
-            file_path=f"/usr/lib/linux/{v.short_name}/config",
-            result_path=v.config_path,
+            result_paths={f"/usr/lib/linux/{v.short_name}/config": v.config_path},
         )
     elif v.modules_download_path.exists():  # from modules
-        extract_deb(
+        stage(
+            "extract_config",
+            extract_deb_files,
             deb_path=v.modules_download_path,
-            file_path=f"/boot/config-{v.short_name}",
-            result_path=v.config_path,
+            result_paths={f"/boot/config-{v.short_name}": v.config_path},
         )
     else:  # from image
-        extract_deb(
+        image_files[f"/boot/config-{v.short_name}"] = v.config_path
+
+    if image_files:
+        stage(
+            "extract_vmlinuz",
+            extract_deb_files,
             deb_path=v.image_download_path,
-            file_path=f"/boot/config-{v.short_name}",
-            result_path=v.config_path,
+            result_paths=image_files,
         )
 
     # Extract BTF
-    extract_btf(
+    stage(
+        "extract_btf",
+        extract_btf,
         vmlinux_path=v.vmlinux_path,
         result_path=v.btf_path,
     )
-    dump_btf_json(
-        raw_btf_path=v.btf_path,
-        result_path=v.btf_json_path,
-    )
-    dump_btf_txt(
+    stage(
+        "dump_btf_txt",
+        dump_btf_txt,
         raw_btf_path=v.btf_path,
         result_path=v.btf_txt_path,
     )
-    dump_btf_header(
+    stage(
+        "dump_btf_header",
+        dump_btf_header,
         raw_btf_path=v.btf_path,
         result_path=v.btf_header_path,
     )
 
-    # Dump type info
-    dump_types(
-        btf_json_path=v.btf_json_path,
-        result_paths={
-            Kind.FUNC: v.func_types_path,
-            Kind.STRUCT: v.struct_types_path,
-            Kind.UNION: v.union_types_path,
-            Kind.ENUM: v.enum_types_path,
-            Kind.INT: v.int_types_path,
-        },
+    # Dump type info directly from the raw BTF, and add it to the type store.
+    # Dumps dropped in favor of the store are not recreated.
+    type_dumps = {
+        Kind.FUNC: v.func_types_path,
+        Kind.STRUCT: v.struct_types_path,
+        Kind.UNION: v.union_types_path,
+        Kind.ENUM: v.enum_types_path,
+        Kind.INT: v.int_types_path,
+    }
+    if not has_dropped_type_dumps(v):
+        stage(
+            "dump_types",
+            dump_types,
+            btf_path=v.btf_path,
+            result_paths=type_dumps,
+        )
+    stage(
+        "dump_type_map",
+        dump_type_map,
+        v=v,
+        deps={attr: getattr(v, attr) for attr in TYPE_STORE_SECTIONS.values()},
+        result_path=v.type_map_path,
     )
 
     # Dump symbol table, tracepoints, functions, syscalls, and comment
-    dump_symtab(
+    stage(
+        "dump_symtab",
+        dump_symtab,
         vmlinux_path=v.vmlinux_path,
         result_path=v.symtab_path,
     )
-    dump_func_entries(
-        v.vmlinux_path,
+    stage(
+        "dump_func_entries",
+        dump_func_entries,
+        path=v.vmlinux_path,
         result_path=v.func_entries_path,
     )
-    dump_func_groups(
+    stage(
+        "dump_func_groups",
+        dump_func_groups,
         func_entries_path=v.func_entries_path,
         symtab_path=v.symtab_path,
         result_path=v.func_groups_path,
     )
-    dump_tracepoints(
+    stage(
+        "dump_tracepoints",
+        dump_tracepoints,
         img=v.img,
+        deps={
+            "vmlinux_path": v.vmlinux_path,
+            "symtab_path": v.symtab_path,
+            "func_types_path": v.func_types_path,
+            "struct_types_path": v.struct_types_path,
+            "enum_types_path": v.enum_types_path,
+            "int_types_path": v.int_types_path,
+        },
         result_path=v.tracepoints_path,
     )
-    dump_syscalls(
+    stage(
+        "dump_syscalls",
+        dump_syscalls,
         img=v.img,
+        deps={
+            "vmlinux_path": v.vmlinux_path,
+            "symtab_path": v.symtab_path,
+        },
         result_path=v.syscalls_path,
     )
-    dump_comment(
+    stage(
+        "dump_comment",
+        dump_comment,
         vmlinux_path=v.vmlinux_path,
         result_path=v.comment_path,
     )
+
+    return stages
+
+
+def prep(v: Version):
+    LinuxImage.disable_cache()
+
+    # Stages are declared in dependency order
+    for stage in get_prep_stages(v):
+        stage.run()
+
+
+def run_prep_stage(v: Version, name: str) -> bool:
+    LinuxImage.disable_cache()
+
+    for stage in get_prep_stages(v):
+        if stage.name == name:
+            return stage.run()
+    raise ValueError(f"Unknown stage {name} for {v}")
+
+
+def get_stage_memory() -> MemoryEstimates:
+    return MemoryEstimates(
+        STAGE_MEMORY_PATH, STAGE_MEMORY_DEFAULTS, STAGE_MEMORY_DEFAULT
+    )
+
+
+def get_prep_tasks(
+    versions: List[Version], memory: Optional[MemoryEstimates] = None
+) -> List[Task]:
+    memory = memory or get_stage_memory()
+    tasks = []
+    for v in versions:
+        stages = get_prep_stages(v)
+        deps = get_stage_deps(stages)
+        for stage in stages:
+            tasks.append(
+                Task(
+                    key=(v, stage.name),
+                    fn=run_prep_stage,
+                    args=(v, stage.name),
+                    deps=tuple((v, dep) for dep in deps[stage.name]),
+                    resource=stage.resource,
+                    # Start the long-running stages as early as possible
+                    priority=int(stage.resource == "heavy"),
+                    memory=memory.get(stage.name),
+                )
+            )
+    return tasks
+
+
+def prep_all(
+    versions: List[Version],
+    num_workers: Optional[int] = None,
+    num_heavy_workers: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+) -> Dict[Hashable, BaseException]:
+    num_workers = num_workers or mp.cpu_count()
+    num_heavy_workers = num_heavy_workers or max(1, num_workers // 4)
+    limits = {
+        "heavy": num_heavy_workers,
+        "light": max(1, num_workers - num_heavy_workers),
+    }
+
+    # Learn the peak RSS of each stage for the memory budget of later runs. Stages
+    # that were up to date only loaded their manifest, so they are not measured.
+    memory = get_stage_memory()
+
+    def on_finish(task: Task, ran: bool, peak: int):
+        if not ran:
+            return
+        _, name = task.key
+        memory.update(name, peak)
+
+    return run_tasks(
+        get_prep_tasks(versions, memory),
+        limits,
+        recycle=["heavy"],
+        memory_budget=memory_budget,
+        on_finish=on_finish,
+    )
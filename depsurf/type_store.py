@@ -0,0 +1,227 @@
+import fcntl
+import json
+import logging
+import os
+import pickle
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from depsurf.btf import LazyTypesData, get_fingerprint
+from depsurf.paths import DATASET_PATH
+from depsurf.utils import InputRecord, is_source_current, manage_result_path
+from depsurf.version import Version
+
+# Each distinct normalized type is pickled once into `store.bin`, keyed by its
+# fingerprint in `store.idx`. A version only keeps a TypeMap of
+# {section: {name: fingerprint}}. Prep writes the map next to the jsonl dumps;
+# `drop_type_dumps` then removes the dumps, after which the store and maps are
+# the only copy of the types and prep no longer recreates them.
+TYPE_STORE_PATH = DATASET_PATH / "type_store"
+
+TYPE_STORE_SECTIONS = {
+    "types_func": "func_types_path",
+    "types_struct": "struct_types_path",
+    "types_union": "union_types_path",
+    "types_enum": "enum_types_path",
+    "types_int": "int_types_path",
+}
+
+
+class TypeStore:
+    instances: Dict[Path, "TypeStore"] = {}
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data_path = path / "store.bin"
+        self.index_path = path / "store.idx"
+        self.index: Dict[str, Tuple[int, int]] = {}
+        # Shared by all versions, so that equal types are the same object
+        self.decoded: Dict[str, Dict] = {}
+        self.fd = None
+        self.load_index()
+
+    def __del__(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+    @classmethod
+    def open(cls, path: Path = TYPE_STORE_PATH) -> "TypeStore":
+        if path not in cls.instances:
+            cls.instances[path] = cls(path)
+        return cls.instances[path]
+
+    def load_index(self):
+        if self.index_path.exists():
+            with open(self.index_path, "rb") as f:
+                self.index = pickle.load(f)
+
+    def dump_index(self):
+        tmp_path = self.path / f"{self.index_path.name}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return fingerprint in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, fingerprint: str) -> Dict:
+        t = self.decoded.get(fingerprint)
+        if t is not None:
+            return t
+
+        if fingerprint not in self.index:
+            # Added by another process since the index was loaded
+            self.load_index()
+        offset, length = self.index[fingerprint]
+        if self.fd is None:
+            self.fd = os.open(self.data_path, os.O_RDONLY)
+        t = pickle.loads(os.pread(self.fd, length, offset))
+        self.decoded[fingerprint] = t
+        return t
+
+    def add_dumps(self, paths: Dict[str, Path]) -> Dict[str, Dict[str, str]]:
+        # Adds the types in the given jsonl dumps and returns their name maps
+        self.path.mkdir(parents=True, exist_ok=True)
+        type_map: Dict[str, Dict[str, str]] = {}
+        num_added = 0
+
+        with open(self.data_path, "ab") as f:
+            # Serialize writers; another one may have extended the index
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self.load_index()
+            f.seek(0, os.SEEK_END)
+
+            for section, path in paths.items():
+                names = {}
+                with open(path, "rb") as fin:
+                    for line in fin:
+                        fingerprint = get_fingerprint(line)
+                        record = json.loads(line)
+                        names[record["name"]] = fingerprint
+                        if fingerprint in self.index:
+                            continue
+                        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                        self.index[fingerprint] = (f.tell(), len(data))
+                        f.write(data)
+                        num_added += 1
+                type_map[section] = names
+
+            f.flush()
+            self.dump_index()
+
+        logging.info(f"Added {num_added} types to {self.path} ({len(self)} total)")
+        return type_map
+
+    def __repr__(self):
+        return f"TypeStore({self.path})"
+
+
+class StoredTypes(Mapping):
+    def __init__(self, store: TypeStore, names: Dict[str, str]):
+        self.store = store
+        # The fingerprints double as structural hashes for diffing
+        self.fingerprints = names
+
+    def __getitem__(self, name: str) -> Dict:
+        return self.store.get(self.fingerprints[name])
+
+    def __contains__(self, name) -> bool:
+        return name in self.fingerprints
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.fingerprints)
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+
+# Names -> fingerprints of each section, with the InputRecord of the dump it was
+# added from
+class TypeMap:
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path) as f:
+            data = json.load(f)
+        # Maps written before sources were recorded have no "sections"
+        self.sections: Dict[str, Dict[str, str]] = data.get("sections", {})
+        self.sources: Dict[str, Dict] = data.get("sources", {})
+        self.current: Dict[str, bool] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def is_current(self, name: str, path: Path) -> bool:
+        # Whether `name` was added from the dump now at `path`
+        if name not in self.current:
+            current = is_source_current(self.sources.get(name), path)
+            if not current:
+                logging.warning(f"Ignoring {name} in {self}: {path} changed")
+            self.current[name] = current
+        return self.current[name]
+
+    def get_types(self, name: str, store: Optional[TypeStore] = None) -> StoredTypes:
+        return StoredTypes(store or TypeStore.open(), self.sections[name])
+
+    def __repr__(self):
+        return f"TypeMap({self.path})"
+
+
+def load_type_map(path: Path) -> Optional[TypeMap]:
+    if not path.exists():
+        return None
+    return TypeMap(path)
+
+
+@manage_result_path
+def dump_type_map(v: Version, result_path: Path, store_path: Path = TYPE_STORE_PATH):
+    paths = {}
+    sources = {}
+    for section, attr in TYPE_STORE_SECTIONS.items():
+        path: Path = getattr(v, attr)
+        if not path.exists():
+            logging.warning(f"Skipping {section} for {v}: {path} not found")
+            continue
+        paths[section] = path
+        sources[section] = vars(InputRecord.from_path(path))
+
+    sections = TypeStore.open(store_path).add_dumps(paths)
+    with open(result_path, "w") as f:
+        json.dump({"sources": sources, "sections": sections}, f)
+
+
+def has_dropped_type_dumps(v: Version) -> bool:
+    return v.type_map_path.exists() and not any(
+        getattr(v, attr).exists() for attr in TYPE_STORE_SECTIONS.values()
+    )
+
+
+def drop_type_dumps(v: Version, store_path: Path = TYPE_STORE_PATH):
+    # Removes the types_* dumps whose content is in the store under the map
+    type_map = load_type_map(v.type_map_path)
+    if type_map is None:
+        raise FileNotFoundError(f"No type map for {v}: {v.type_map_path}")
+    store = TypeStore.open(store_path)
+    store.load_index()
+
+    num_bytes = 0
+    for section, attr in TYPE_STORE_SECTIONS.items():
+        path: Path = getattr(v, attr)
+        if not path.exists():
+            continue
+        if section not in type_map or not type_map.is_current(section, path):
+            logging.warning(f"Keeping {path}: not in {type_map}")
+            continue
+        missing = [fp for fp in type_map.sections[section].values() if fp not in store]
+        if missing:
+            logging.warning(f"Keeping {path}: {len(missing)} types not in {store}")
+            continue
+
+        num_bytes += path.stat().st_size
+        path.unlink()
+        LazyTypesData.get_index_path(path).unlink(missing_ok=True)
+
+    logging.info(f"Dropped {num_bytes / 2**20:.0f} MiB of type dumps for {v}")
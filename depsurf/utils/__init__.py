@@ -1,4 +1,6 @@
 from .color import *
 from .decorator import *
 from .enum import *
+from .manifest import *
+from .scheduler import *
 from .system import *
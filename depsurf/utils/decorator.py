@@ -1,10 +1,11 @@
 import logging
 from pathlib import Path
+from typing import Any, Dict
 
 from .color import TermColor
 
 
-def manage_result_path(fn):
+def manage_result_paths(fn):
     def wrapper(*args, **kwargs):
         fn_name = fn.__name__
 
@@ -13,27 +14,52 @@ def manage_result_path(fn):
                 return
             logging.info(f"{fn_name:<18} {msg} {path}")
 
-        for kwarg in ("result_path",):
+        for kwarg in ("result_paths",):
             assert kwarg in kwargs, f"Missing '{kwarg}' in kwargs for {fn_name}"
 
         overwrite: bool = kwargs.pop("overwrite", False)
         slient: bool = kwargs.pop("slient", False)
-        result_path: Path = kwargs.pop("result_path")
+        result_paths: Dict[Any, Path] = kwargs.pop("result_paths")
+
+        tmp_paths: Dict[Any, Path] = {}
+        for key, result_path in result_paths.items():
+            if not overwrite and result_path.exists():
+                log_info(f"{TermColor.WARNING}Skipped{TermColor.ENDC}", result_path)
+                continue
+
+            tmp_path = result_path.parent / f"{result_path.name}.tmp"
+            tmp_path.unlink(missing_ok=True)
+            tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_paths[key] = tmp_path
 
-        if not overwrite and result_path.exists():
-            log_info(f"{TermColor.WARNING}Skipped{TermColor.ENDC}", result_path)
+        if not tmp_paths:
             return
 
-        tmp_path = result_path.parent / f"{result_path.name}.tmp"
-        tmp_path.unlink(missing_ok=True)
-        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        for key in tmp_paths:
+            log_info(f"{TermColor.OKBLUE}Writing{TermColor.ENDC}", result_paths[key])
+        fn(*args, **kwargs, result_paths=tmp_paths)
+        for key, tmp_path in tmp_paths.items():
+            tmp_path.rename(result_paths[key])
+            log_info(f"{TermColor.OKGREEN}Written{TermColor.ENDC}", result_paths[key])
+
+    return wrapper
+
 
-        log_info(f"{TermColor.OKBLUE}Writing{TermColor.ENDC}", result_path)
-        fn(*args, **kwargs, result_path=tmp_path)
-        tmp_path.rename(result_path)
-        log_info(f"{TermColor.OKGREEN}Written{TermColor.ENDC}", result_path)
+def manage_result_path(fn):
+    # A single `result_path`, managed as the only entry of `result_paths`
+    def fn_paths(*args, result_paths: Dict[Any, Path], **kwargs):
+        return fn(*args, **kwargs, result_path=result_paths[None])
+
+    fn_paths.__name__ = fn.__name__
+    managed = manage_result_paths(fn_paths)
+
+    def wrapper(*args, **kwargs):
+        fn_name = fn.__name__
+        assert "result_path" in kwargs, f"Missing 'result_path' in kwargs for {fn_name}"
+        result_path: Path = kwargs.pop("result_path")
+        return managed(*args, **kwargs, result_paths={None: result_path})
 
     return wrapper
 
 
-__all__ = ["manage_result_path"]
+__all__ = ["manage_result_path", "manage_result_paths"]
@@ -0,0 +1,179 @@
+import dataclasses
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .color import TermColor
+
+
+def get_manifest_path(result_path: Path) -> Path:
+    return result_path.parent / f"{result_path.name}.manifest.json"
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@dataclass
+class InputRecord:
+    size: int
+    mtime_ns: int
+    sha256: str
+
+    @classmethod
+    def from_path(cls, path: Path, prev: Optional["InputRecord"] = None):
+        stat = path.stat()
+        # Only rehash inputs that were touched since the last run
+        if prev is not None and (prev.size, prev.mtime_ns) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return prev
+        return cls(stat.st_size, stat.st_mtime_ns, file_digest(path))
+
+    def matches(self, path: Path) -> bool:
+        # Whether `path` still has the content this record was taken from
+        return InputRecord.from_path(path, self).sha256 == self.sha256
+
+
+# Whether something derived from `path` when it had `record` (a dict of an
+# InputRecord) is still current. Without the file, e.g. in a dataset published
+# without it, what was derived from it is all there is.
+def is_source_current(record: Optional[Dict], path: Path) -> bool:
+    if not path.exists():
+        return True
+    return record is not None and InputRecord(**record).matches(path)
+
+
+# A stable string for a stage argument, or None for arguments that are not
+# recorded (e.g. objects like a Version, whose fields show up in the paths)
+def get_param(value) -> Optional[str]:
+    if isinstance(value, (str, int, float, bool, Path)):
+        return str(value)
+    if isinstance(value, dict):
+        return json.dumps({str(k): str(v) for k, v in value.items()}, sort_keys=True)
+    return None
+
+
+# What a stage output was computed from: the stage code version, its
+# parameters, and the digests of its input files
+@dataclass
+class StageManifest:
+    stage: str
+    version: int
+    params: Dict[str, str]
+    inputs: Dict[str, InputRecord]
+
+    @classmethod
+    def from_inputs(
+        cls,
+        stage: str,
+        version: int,
+        params: Dict[str, str],
+        inputs: Dict[str, Path],
+        prev: Optional["StageManifest"] = None,
+    ):
+        prev_inputs = {} if prev is None else prev.inputs
+        return cls(
+            stage=stage,
+            version=version,
+            params=params,
+            inputs={
+                name: InputRecord.from_path(path, prev_inputs.get(name))
+                for name, path in inputs.items()
+            },
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["StageManifest"]:
+        if not path.exists():
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        data["inputs"] = {
+            name: InputRecord(**record) for name, record in data["inputs"].items()
+        }
+        return cls(**data)
+
+    def dump(self, path: Path):
+        with open(path, "w") as f:
+            json.dump(dataclasses.asdict(self), f, indent=2)
+
+    @property
+    def key(self):
+        digests = {name: record.sha256 for name, record in self.inputs.items()}
+        return self.stage, self.version, self.params, digests
+
+
+# Runs a @manage_result_path(s) function unless the manifest next to its first
+# output shows it was produced from the same inputs. Path arguments (and `deps`
+# for inputs that are not passed as paths) are hashed, and scalar, path and
+# dict arguments, such as the member names in `result_paths`, are recorded as
+# parameters. Returns whether the stage was run.
+def run_stage(
+    stage: str,
+    version: int,
+    fn: Callable,
+    deps: Optional[Dict[str, Path]] = None,
+    **kwargs,
+) -> bool:
+    if "result_paths" in kwargs:
+        outputs: List[Path] = list(kwargs["result_paths"].values())
+    else:
+        outputs = [kwargs["result_path"]]
+    manifest_path = get_manifest_path(outputs[0])
+
+    inputs = {
+        name: value
+        for name, value in kwargs.items()
+        if isinstance(value, Path) and name != "result_path"
+    }
+    inputs.update(deps or {})
+    params: Dict[str, str] = {}
+    for name, value in kwargs.items():
+        param = get_param(value)
+        if param is not None:
+            params[name] = param
+
+    prev = StageManifest.load(manifest_path)
+    if all(path.exists() for path in inputs.values()):
+        curr = StageManifest.from_inputs(stage, version, params, inputs, prev)
+    else:
+        curr = None
+
+    if all(path.exists() for path in outputs):
+        if curr is None:
+            # e.g. downloads removed after extraction; nothing to recompute from
+            logging.info(f"{stage:<18} Keeping {outputs[0]} (missing inputs)")
+            return False
+        if prev is None:
+            # Outputs from before manifests existed are trusted as they are. A
+            # failed run keeps the manifest of the outputs it did not replace.
+            logging.info(f"{stage:<18} Adopting {outputs[0]}")
+            curr.dump(manifest_path)
+            return False
+        if prev.key == curr.key:
+            msg = f"{TermColor.WARNING}Unchanged{TermColor.ENDC}"
+            logging.info(f"{stage:<18} {msg} {outputs[0]}")
+            if prev != curr:
+                curr.dump(manifest_path)
+            return False
+
+    fn(**kwargs, overwrite=True)
+    if curr is not None:
+        curr.dump(manifest_path)
+    return True
+
+
+__all__ = [
+    "InputRecord",
+    "StageManifest",
+    "file_digest",
+    "get_manifest_path",
+    "is_source_current",
+    "run_stage",
+]
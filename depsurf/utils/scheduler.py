@@ -0,0 +1,198 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import resource
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from .color import TermColor
+
+
+@dataclass(frozen=True)
+class Task:
+    key: Hashable
+    fn: Callable
+    args: Tuple = ()
+    deps: Tuple[Hashable, ...] = ()
+    resource: str = "light"
+    # Ready tasks with a higher priority are started first
+    priority: int = 0
+    # Estimated peak RSS in bytes, used when running with a memory budget
+    memory: int = 0
+
+
+class DependencyFailed(Exception):
+    pass
+
+
+def get_dependents(tasks: Iterable[Task]) -> Dict[Hashable, List[Hashable]]:
+    dependents: Dict[Hashable, List[Hashable]] = {}
+    for task in tasks:
+        for dep in task.deps:
+            dependents.setdefault(dep, []).append(task.key)
+    return dependents
+
+
+def get_total_memory() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when 5 is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_measured(fn: Callable, *args):
+    reset_peak_rss()
+    result = fn(*args)
+    return result, get_peak_rss()
+
+
+# Peak RSS observed per kind of task, kept across runs in a JSON file
+class MemoryEstimates:
+    def __init__(self, path: Path, defaults: Dict[str, int], default: int):
+        self.path = path
+        self.defaults = defaults
+        self.default = default
+        self.peaks: Dict[str, int] = {}
+        if path.exists():
+            with open(path) as f:
+                self.peaks = json.load(f)
+
+    def get(self, kind: str, margin: float = 1.1) -> int:
+        peak = self.peaks.get(kind)
+        if peak is None:
+            return self.defaults.get(kind, self.default)
+        return int(peak * margin)
+
+    def update(self, kind: str, peak: int):
+        if peak <= self.peaks.get(kind, 0):
+            return
+        self.peaks[kind] = peak
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.parent / f"{self.path.name}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.peaks, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+# Runs a DAG of tasks with one process pool per resource class, so that e.g.
+# memory-heavy tasks are limited to a few workers while light ones fill the rest.
+# Workers of the classes in `recycle` are replaced after every task to return
+# their memory. With a memory budget, a task is only started if its estimated
+# peak RSS fits next to those of the running tasks (or nothing else is running).
+# on_finish is called with each successful task, its result and its measured
+# peak RSS.
+# Returns the exception of each task that failed or was skipped because a
+# dependency failed.
+def run_tasks(
+    tasks: List[Task],
+    limits: Dict[str, int],
+    recycle: Iterable[str] = (),
+    memory_budget: Optional[int] = None,
+    on_finish: Optional[Callable[[Task, Any, int], None]] = None,
+) -> Dict[Hashable, BaseException]:
+    pending: Dict[Hashable, Task] = {task.key: task for task in tasks}
+    order = {task.key: i for i, task in enumerate(tasks)}
+    for task in tasks:
+        for dep in task.deps:
+            assert dep in pending, f"Unknown dependency {dep} of {task.key}"
+    for task in tasks:
+        assert task.resource in limits, f"No limit for resource {task.resource}"
+    dependents = get_dependents(tasks)
+
+    done: Set[Hashable] = set()
+    failed: Dict[Hashable, BaseException] = {}
+    running: Dict[Future, Task] = {}
+    usage = {kind: 0 for kind in limits}
+    memory_used = 0
+
+    def fail(key: Hashable, exc: BaseException):
+        failed[key] = exc
+        for dependent in dependents.get(key, []):
+            if dependent in pending:
+                del pending[dependent]
+                fail(dependent, DependencyFailed(f"{key} failed"))
+
+    pools: Dict[str, ProcessPoolExecutor] = {}
+    for kind, limit in limits.items():
+        if kind in recycle:
+            pools[kind] = ProcessPoolExecutor(limit, max_tasks_per_child=1)
+        else:
+            pools[kind] = ProcessPoolExecutor(limit, mp.get_context("fork"))
+
+    try:
+        while pending or running:
+            ready = sorted(
+                (task for task in pending.values() if done.issuperset(task.deps)),
+                key=lambda task: (-task.priority, order[task.key]),
+            )
+            for task in ready:
+                if usage[task.resource] >= limits[task.resource]:
+                    continue
+                if (
+                    memory_budget is not None
+                    and running
+                    and memory_used + task.memory > memory_budget
+                ):
+                    continue
+                del pending[task.key]
+                usage[task.resource] += 1
+                memory_used += task.memory
+                pool = pools[task.resource]
+                running[pool.submit(run_measured, task.fn, *task.args)] = task
+
+            assert running, f"Tasks with unsatisfiable dependencies: {list(pending)}"
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                usage[task.resource] -= 1
+                memory_used -= task.memory
+                exc = future.exception()
+                if exc is None:
+                    done.add(task.key)
+                    result, peak = future.result()
+                    logging.info(
+                        f"{TermColor.OKGREEN}Done{TermColor.ENDC} {task.key} "
+                        f"(peak RSS {peak / 2**20:.0f} MiB)"
+                    )
+                    if on_finish is not None:
+                        on_finish(task, result, peak)
+                else:
+                    msg = f"{TermColor.FAIL}Failed{TermColor.ENDC} {task.key}"
+                    logging.error(msg, exc_info=exc)
+                    fail(task.key, exc)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(cancel_futures=True)
+
+    return failed
+
+
+__all__ = [
+    "DependencyFailed",
+    "MemoryEstimates",
+    "Task",
+    "get_total_memory",
+    "run_tasks",
+]
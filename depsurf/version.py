@@ -162,6 +162,14 @@ class Version:
     def comment_path(self):
         return DATASET_PATH / "comment" / f"{self.name}.txt"
 
+    @property
+    def pack_path(self):
+        return DATASET_PATH / "pack" / f"{self.name}.pack"
+
+    @property
+    def type_map_path(self):
+        return DATASET_PATH / "type_map" / f"{self.name}.json"
+
     @cached_property
     def img(self) -> "LinuxImage":
         from depsurf.linux_image import LinuxImage
@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from typing import Dict, Iterator, List, Tuple
 
 from depsurf.dep import Dep, DepDelta, DepKind
-from depsurf.diff import BaseChange, diff_dict
+from depsurf.diff import BaseChange
 from depsurf.issues import IssueEnum
 from depsurf.version import Version
 
@@ -60,11 +60,21 @@ class VersionPair:
     def diff_kind(self, kind: DepKind) -> DiffKindResult:
         dict1 = self.v1.img.get_all_by_kind(kind)
         dict2 = self.v2.img.get_all_by_kind(kind)
-        added, removed, common = diff_dict(dict1, dict2)
+        fps1 = self.v1.img.get_fingerprints_by_kind(kind)
+        fps2 = self.v2.img.get_fingerprints_by_kind(kind)
 
+        added = {name: dict2[name] for name in dict2 if name not in dict1}
+        removed = {name: dict1[name] for name in dict1 if name not in dict2}
         changed: Dict[str, List[BaseChange]] = {}
 
-        for name, (old, new) in common.items():
+        for name in dict1:
+            if name not in dict2:
+                continue
+            # Equal fingerprints mean equal entries, which need not be decoded
+            if fps1 is not None and fps2 is not None and fps1[name] == fps2[name]:
+                continue
+
+            old, new = dict1[name], dict2[name]
             if old == new:
                 continue
 
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+import depsurf.version as dv
+from depsurf.version import Version
+
+
+@pytest.fixture
+def write_structs():
+    def write(v: Version, names):
+        v.struct_types_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(v.struct_types_path, "w") as f:
+            for name in names:
+                record = {"name": name, "kind": "STRUCT", "members": []}
+                f.write(json.dumps(record) + "\n")
+
+    return write
+
+
+# A version whose dataset lives in tmp_path, with structs "a" and "b"
+@pytest.fixture
+def version(tmp_path, monkeypatch, write_structs):
+    monkeypatch.setattr(dv, "DATASET_PATH", tmp_path)
+    v = Version.from_str("5.4.0-26-generic-amd64")
+    write_structs(v, ["a", "b"])
+    return v
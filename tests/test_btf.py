@@ -0,0 +1,62 @@
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+from depsurf.btf import BTF_MAGIC, load_btf_types
+
+DATA_PATH = Path(__file__).parent / "data"
+
+STRS = b"\x00int\x00foo\x00a\x00b\x00p\x00e\x00E_NEG\x00E_ONE\x00x\x00f\x00"
+
+
+def name(s: str) -> int:
+    return STRS.index(s.encode() + b"\x00")
+
+
+def btf_type(kind: int, vlen: int, size_or_type: int, name_off=0, kflag=0):
+    info = (kflag << 31) | (kind << 24) | vlen
+    return struct.pack("<III", name_off, info, size_or_type)
+
+
+# The types in data/btf_dump.json, as the kernel lays them out in .BTF
+TYPES = b"".join(
+    [
+        btf_type(1, 0, 4, name("int")) + struct.pack("<I", (1 << 24) | 32),
+        btf_type(2, 0, 1),
+        btf_type(4, 3, 16, name("foo"), kflag=1)
+        + struct.pack("<III", name("a"), 1, 0)
+        + struct.pack("<III", name("b"), 1, (3 << 24) | 32)
+        + struct.pack("<III", name("p"), 2, 64),
+        btf_type(6, 2, 4, name("e"), kflag=1)
+        + struct.pack("<Ii", name("E_NEG"), -1)
+        + struct.pack("<Ii", name("E_ONE"), 1),
+        btf_type(3, 0, 0) + struct.pack("<III", 1, 1, 4),
+        btf_type(13, 1, 1) + struct.pack("<II", name("x"), 3),
+        btf_type(12, 1, 6, name("f")),
+    ]
+)
+
+
+def write_btf(path: Path, types: bytes):
+    header = struct.pack(
+        "<HBBIIIII", BTF_MAGIC, 1, 0, 24, 0, len(types), len(types), len(STRS)
+    )
+    path.write_bytes(header + types + STRS)
+
+
+def test_load_btf_types(tmp_path):
+    path = tmp_path / "vmlinux.btf"
+    write_btf(path, TYPES)
+    with open(DATA_PATH / "btf_dump.json") as f:
+        expected = json.load(f)["types"]
+    assert load_btf_types(path) == expected
+
+
+@pytest.mark.parametrize("kind", [0, 25])
+def test_unknown_kind(tmp_path, kind):
+    path = tmp_path / "vmlinux.btf"
+    write_btf(path, btf_type(kind, 0, 0))
+    with pytest.raises(ValueError, match="Unknown BTF kind"):
+        load_btf_types(path)
@@ -0,0 +1,58 @@
+import json
+import random
+from types import SimpleNamespace
+
+from depsurf.btf import get_fingerprint
+from depsurf.dep import DepKind
+from depsurf.diff_matrix import DiffMatrix, build_timeline
+
+
+class FakeVersion:
+    def __init__(self, name: str, configs: dict):
+        self.name = name
+        self.img = SimpleNamespace(get_all_by_kind=lambda kind: configs)
+
+
+def make_versions(num_versions: int, num_names: int):
+    rng = random.Random(0)
+    versions = []
+    for i in range(num_versions):
+        configs = {
+            f"CONFIG_{n}": rng.choice("ymn")
+            for n in range(num_names)
+            if rng.random() < 0.8
+        }
+        versions.append(FakeVersion(f"v{i}", configs))
+    return versions
+
+
+def test_counts_match_diff_kind():
+    kind = DepKind.CONFIG
+    versions = make_versions(num_versions=6, num_names=40)
+    columns = []
+    for v in versions:
+        configs = v.img.get_all_by_kind(kind)
+        names = list(configs)
+        columns.append(
+            (names, [get_fingerprint(json.dumps(configs[n]).encode()) for n in names])
+        )
+    matrix = DiffMatrix(versions, {kind: build_timeline(columns)})
+
+    counts = matrix.get_counts(kind)
+    for i, v1 in enumerate(versions):
+        for j, v2 in enumerate(versions):
+            result = matrix.diff_kind(v1, v2, kind)
+            old = v1.img.get_all_by_kind(kind)
+            new = v2.img.get_all_by_kind(kind)
+            assert set(result.added) == new.keys() - old.keys()
+            assert set(result.removed) == old.keys() - new.keys()
+            assert set(result.changed) == {
+                n for n in old.keys() & new.keys() if old[n] != new[n]
+            }
+
+            assert counts["added"][i, j] == len(result.added)
+            assert counts["removed"][i, j] == len(result.removed)
+            # Any change of a config value is reported by its differ
+            assert counts["changed"][i, j] == len(result.changed)
+            assert result.old_len == len(old)
+            assert result.new_len == len(new)
@@ -0,0 +1,68 @@
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from elftools.elf.elffile import ELFFile
+
+from depsurf.funcs.dwarf_dump import FunctionRecorder, get_cu_offsets
+
+DW_LANG_RUST = 0x001C
+
+
+class RustCU:
+    cu_offset = 0
+
+    def get_top_DIE(self):
+        return SimpleNamespace(
+            attributes={"DW_AT_language": SimpleNamespace(value=DW_LANG_RUST)},
+            get_full_path=lambda: "/build/linux/rust/kernel/lib.rs",
+        )
+
+
+def test_shard_starting_on_rust_cu():
+    obj = FunctionRecorder.from_cus([RustCU(), RustCU()])
+    assert list(obj.iter_groups()) == []
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_rust_cu_before_c_cu(tmp_path):
+    src = tmp_path / "prog.c"
+    src.write_text("int foo(int x) { return x + 1; }\n")
+    obj_path = tmp_path / "prog.o"
+    subprocess.check_call(["gcc", "-g", "-c", str(src), "-o", str(obj_path)])
+
+    with open(obj_path, "rb") as f:
+        cus = list(ELFFile(f).get_dwarf_info().iter_CUs())
+        obj = FunctionRecorder.from_cus([RustCU(), *cus])
+
+    assert [func.name for func in obj.iter_funcs()] == ["foo"]
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_parallel_matches_sequential(tmp_path):
+    objs = []
+    for i in range(5):
+        src = tmp_path / f"prog{i}.c"
+        src.write_text(
+            f"static inline int sq(int x) {{ return x * x; }}\n"
+            f"int foo{i}(int x) {{ return sq(x) + {i}; }}\n"
+        )
+        obj_path = tmp_path / f"prog{i}.o"
+        subprocess.check_call(
+            ["gcc", "-g", "-O2", "-fPIC", "-c", str(src), "-o", str(obj_path)]
+        )
+        objs.append(str(obj_path))
+    path = tmp_path / "prog.so"
+    subprocess.check_call(["gcc", "-shared", "-nostdlib", *objs, "-o", str(path)])
+
+    with open(path, "rb") as f:
+        cus = list(ELFFile(f).get_dwarf_info().iter_CUs())
+    size, offsets = get_cu_offsets(path)
+    assert offsets == [cu.cu_offset for cu in cus]
+    assert size == cus[-1].cu_offset + cus[-1].size
+
+    expected = FunctionRecorder.from_path(path)
+    actual = FunctionRecorder.from_path_parallel(path, num_workers=2, num_shards=3)
+    assert list(actual.iter_funcs()) == list(expected.iter_funcs())
+    assert len(list(actual.iter_funcs())) == 10
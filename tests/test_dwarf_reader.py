@@ -0,0 +1,61 @@
+import shutil
+import subprocess
+
+import pytest
+from elftools.dwarf.enums import ENUM_DW_TAG
+from elftools.elf.elffile import ELFFile
+
+from depsurf.funcs.dwarf import DIEHandler, Traverser
+from depsurf.funcs.dwarf_reader import WANTED_ATTRS
+
+SOURCE = """
+struct point { int x, y; };
+
+extern int ext(int);
+
+static inline int sq(int x) { return x * x; }
+
+static int norm(struct point *p) { return sq(p->x) + sq(p->y); }
+
+int dist(struct point *p, struct point *q)
+{
+    struct point d = { p->x - q->x, p->y - q->y };
+    return norm(&d) + ext(d.x);
+}
+"""
+
+
+def walk(obj_path, raw: bool):
+    dies = []
+
+    def record(die, traverser):
+        attrs = {
+            name: (attr.form, attr.value)
+            for name, attr in die.attributes.items()
+            if name in WANTED_ATTRS
+        }
+        dies.append((die.offset, die.tag, attrs))
+
+    handler_map = {tag: DIEHandler(rec=True, fn=record) for tag in ENUM_DW_TAG}
+    with open(obj_path, "rb") as f:
+        for cu in ELFFile(f).get_dwarf_info().iter_CUs():
+            Traverser(cu.get_top_DIE(), handler_map, raw=raw).traverse()
+    return dies
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+@pytest.mark.parametrize("dwarf_version", [4, 5])
+@pytest.mark.parametrize("opt", ["-O0", "-O2"])
+def test_raw_matches_pyelftools(tmp_path, dwarf_version, opt):
+    src = tmp_path / "prog.c"
+    src.write_text(SOURCE)
+    obj_path = tmp_path / "prog.o"
+    subprocess.check_call(
+        ["gcc", f"-gdwarf-{dwarf_version}", opt, "-c", str(src), "-o", str(obj_path)]
+    )
+
+    expected = walk(obj_path, raw=False)
+    assert any(tag == "DW_TAG_inlined_subroutine" for _, tag, _ in expected) == (
+        opt == "-O2"
+    )
+    assert walk(obj_path, raw=True) == expected
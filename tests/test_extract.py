@@ -0,0 +1,46 @@
+import io
+import tarfile
+
+import zstandard
+
+from depsurf.linux.extract import extract_deb_files
+
+
+def make_ar(members):
+    out = io.BytesIO()
+    out.write(b"!<arch>\n")
+    for name, data in members:
+        header = (
+            f"{name:<16}{0:<12}{0:<6}{0:<6}{100644:<8}{len(data):<10}`\n".encode()
+        )
+        out.write(header + data)
+        if len(data) % 2:
+            out.write(b"\n")
+    return out.getvalue()
+
+
+def make_tar(files):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def test_extract_zstd_deb(tmp_path):
+    config = b"CONFIG_BPF=y\n" * 1000
+    data = make_tar({"./boot/vmlinuz": b"\x7fELF", "./boot/config": config})
+    # Two frames, as written by multi-threaded zstd
+    cctx = zstandard.ZstdCompressor()
+    frames = cctx.compress(data[:4096]) + cctx.compress(data[4096:])
+
+    deb_path = tmp_path / "linux.deb"
+    deb_path.write_bytes(
+        make_ar([("debian-binary", b"2.0\n"), ("data.tar.zst", frames)])
+    )
+
+    result_path = tmp_path / "config"
+    extract_deb_files(deb_path, result_paths={"/boot/config": result_path})
+    assert result_path.read_bytes() == config
@@ -0,0 +1,71 @@
+import struct
+
+import numpy as np
+import pytest
+
+from depsurf.linux.filebytes import FileBytes
+
+ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+PROGRAM_HEADER = struct.Struct("<IIQQQQQQ")
+
+
+def write_elf(path, segments):
+    # A little-endian ELF64 image with one PT_LOAD per (vaddr, data)
+    header_size = ELF_HEADER.size + PROGRAM_HEADER.size * len(segments)
+    phdrs = b""
+    body = b""
+    for vaddr, data in segments:
+        offset = header_size + len(body)
+        size = len(data)
+        phdrs += PROGRAM_HEADER.pack(1, 4, offset, vaddr, vaddr, size, size, 1)
+        body += data
+    ident = b"\x7fELF\x02\x01\x01".ljust(16, b"\x00")
+    header = ELF_HEADER.pack(
+        ident,
+        2,  # ET_EXEC
+        62,  # EM_X86_64
+        1,
+        0,
+        ELF_HEADER.size,  # e_phoff
+        0,
+        0,
+        ELF_HEADER.size,
+        PROGRAM_HEADER.size,
+        len(segments),
+        64,
+        0,
+        0,
+    )
+    path.write_bytes(header + phdrs + body)
+
+
+def u64s(*values):
+    return b"".join(v.to_bytes(8, "little") for v in values)
+
+
+@pytest.fixture
+def filebytes(tmp_path):
+    path = tmp_path / "vmlinux"
+    # Adjacent in memory, but with padding between them in the file
+    write_elf(path, [(0x1000, u64s(1, 2)), (0x1010, u64s(3, 4) + b"\xff" * 8)])
+    return FileBytes(path)
+
+
+def test_int_array_within_segment(filebytes):
+    assert filebytes.get_int_array(0x1010, 2, 8).tolist() == [3, 4]
+
+
+def test_int_array_across_segments(filebytes):
+    assert filebytes.get_int_array(0x1008, 3, 8).tolist() == [2, 3, 4]
+
+
+def test_int_array_past_mapping(filebytes):
+    # The check itself does not raise; the unmapped element does
+    with pytest.raises(ValueError, match="1028 not found"):
+        filebytes.get_int_array(0x1018, 3, 8)
+
+
+def test_ptr_array(filebytes):
+    result = filebytes.get_ptr_array(0x1000, 0x1020)
+    assert result.dtype == np.uint64
+    assert result.tolist() == [1, 2, 3, 4]
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from depsurf.utils import (
+    get_manifest_path,
+    manage_result_path,
+    manage_result_paths,
+    run_stage,
+)
+
+
+@manage_result_path
+def copy_upper(input_path: Path, result_path: Path):
+    result_path.write_text(input_path.read_text().upper())
+
+
+@manage_result_path
+def copy_fail(input_path: Path, result_path: Path):
+    result_path.write_text("partial")
+    raise RuntimeError("stage failed")
+
+
+@manage_result_paths
+def copy_member(input_path: Path, result_paths: Dict[str, Path]):
+    for name, path in result_paths.items():
+        path.write_text(f"{name}: {input_path.read_text()}")
+
+
+def test_rerun_after_failure(tmp_path):
+    input_path = tmp_path / "input.txt"
+    result_path = tmp_path / "output.txt"
+
+    input_path.write_text("old")
+    assert run_stage(
+        "copy", 1, copy_upper, input_path=input_path, result_path=result_path
+    )
+    assert result_path.read_text() == "OLD"
+    assert get_manifest_path(result_path).exists()
+
+    input_path.write_text("new")
+    with pytest.raises(RuntimeError):
+        run_stage("copy", 1, copy_fail, input_path=input_path, result_path=result_path)
+    # The old output and its manifest are left as they were
+    assert result_path.read_text() == "OLD"
+    assert get_manifest_path(result_path).exists()
+
+    # The stale output is neither adopted nor considered unchanged
+    assert run_stage(
+        "copy", 1, copy_upper, input_path=input_path, result_path=result_path
+    )
+    assert result_path.read_text() == "NEW"
+
+
+def test_unchanged_and_adopted(tmp_path):
+    input_path = tmp_path / "input.txt"
+    result_path = tmp_path / "output.txt"
+    input_path.write_text("old")
+    result_path.write_text("kept")
+    kwargs = dict(input_path=input_path, result_path=result_path)
+
+    assert not run_stage("copy", 1, copy_upper, **kwargs)
+    assert result_path.read_text() == "kept"
+
+    assert not run_stage("copy", 1, copy_upper, **kwargs)
+    assert result_path.read_text() == "kept"
+
+    assert run_stage("copy", 2, copy_upper, **kwargs)
+    assert result_path.read_text() == "OLD"
+
+
+def test_rerun_on_member_change(tmp_path):
+    input_path = tmp_path / "input.txt"
+    result_path = tmp_path / "config"
+    input_path.write_text("old")
+
+    def run(member: str):
+        return run_stage(
+            "copy",
+            1,
+            copy_member,
+            input_path=input_path,
+            result_paths={member: result_path},
+        )
+
+    assert run("/boot/config-5.4.0-26-generic")
+    assert not run("/boot/config-5.4.0-26-generic")
+    assert run("/usr/lib/linux/5.4.0-26-generic/config")
+    assert result_path.read_text() == "/usr/lib/linux/5.4.0-26-generic/config: old"
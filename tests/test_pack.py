@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from depsurf.linux_image import LinuxImage
+from depsurf.pack import PACK_HEADER, dump_pack
+
+
+@pytest.fixture
+def packed(version):
+    dump_pack(version, result_path=version.pack_path)
+    return version
+
+
+def test_pack_is_used(packed):
+    img = LinuxImage(packed)
+    assert img.has_packed("types_struct")
+    assert list(img.struct_types.data) == ["a", "b"]
+
+
+def test_stale_pack_falls_back(packed, write_structs):
+    write_structs(packed, ["a", "b", "c"])
+    img = LinuxImage(packed)
+    assert not img.has_packed("types_struct")
+    assert list(img.struct_types.data) == ["a", "b", "c"]
+
+
+def test_touched_source_keeps_pack(packed):
+    stat = packed.struct_types_path.stat()
+    os.utime(packed.struct_types_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert LinuxImage(packed).has_packed("types_struct")
+
+
+def test_pack_without_source(packed):
+    packed.struct_types_path.unlink()
+    img = LinuxImage(packed)
+    assert img.has_packed("types_struct")
+    assert list(img.struct_types.data) == ["a", "b"]
+
+
+def test_old_pack_is_ignored(packed):
+    with open(packed.pack_path, "r+b") as f:
+        magic, _, *offsets = PACK_HEADER.unpack(f.read(PACK_HEADER.size))
+        f.seek(0)
+        f.write(PACK_HEADER.pack(magic, 1, *offsets))
+    img = LinuxImage(packed)
+    assert img.pack is None
+    assert list(img.struct_types.data) == ["a", "b"]
@@ -0,0 +1,63 @@
+import pytest
+
+from depsurf.diff_cache import DiffCache
+from depsurf.linux_image import LinuxImage
+from depsurf.prep import get_prep_stages
+from depsurf.type_store import (
+    TypeStore,
+    drop_type_dumps,
+    dump_type_map,
+    has_dropped_type_dumps,
+)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> TypeStore:
+    monkeypatch.setattr(TypeStore, "instances", {})
+    return TypeStore.open(tmp_path / "store")
+
+
+@pytest.fixture
+def stored(version, store):
+    dump_type_map(version, result_path=version.type_map_path, store_path=store.path)
+    return version
+
+
+def test_type_map_is_used(stored, store):
+    img = LinuxImage(stored)
+    assert img.has_stored("types_struct", stored.struct_types_path)
+    types = img.type_map.get_types("types_struct", store)
+    assert list(types) == ["a", "b"]
+    assert types["a"] == {"name": "a", "kind": "STRUCT", "members": []}
+
+
+def test_stale_type_map_falls_back(stored, write_structs):
+    write_structs(stored, ["a", "b", "c"])
+    img = LinuxImage(stored)
+    assert not img.has_stored("types_struct", stored.struct_types_path)
+    assert list(img.struct_types.data) == ["a", "b", "c"]
+
+
+def test_drop_type_dumps(stored, store, tmp_path):
+    digest = DiffCache(tmp_path / "cache").get_input_digest(stored, "struct_types_path")
+    drop_type_dumps(stored, store_path=store.path)
+    assert not stored.struct_types_path.exists()
+    assert has_dropped_type_dumps(stored)
+
+    img = LinuxImage(stored)
+    assert img.has_stored("types_struct", stored.struct_types_path)
+    assert list(img.struct_types.data) == ["a", "b"]
+
+    # Cached diffs stay keyed by the digest of the dropped dump
+    cache = DiffCache(tmp_path / "cache")
+    assert cache.get_input_digest(stored, "struct_types_path") == digest
+
+    # Prep keeps the map instead of dumping the types again
+    names = [stage.name for stage in get_prep_stages(stored)]
+    assert "dump_types" not in names and "dump_type_map" in names
+
+
+def test_drop_keeps_stale_dumps(stored, store, write_structs):
+    write_structs(stored, ["a", "b", "c"])
+    drop_type_dumps(stored, store_path=store.path)
+    assert stored.struct_types_path.exists()